@@ -1,10 +1,142 @@
+import math
 import cv2
 import numpy as np
-from PIL import Image
-import io
+from image_io import decode_image
+
+# --- Adaptive Sampling (large images) ---
+# On big images the blur and brightness checks are estimated from a random
+# sample of full-resolution tiles first. Sampling stops once the result
+# (status + issues, and the score to within SCORE_TOLERANCE points) is the same
+# across the whole confidence interval, so a sampled score can't drift from the
+# exact one by more than that. For borderline images it falls back to the exact
+# full pass.
+SAMPLING_MIN_PIXELS = 12_000_000  # Smaller images are always analyzed exactly
+SAMPLE_TILE = 128
+SAMPLE_INITIAL_TILES = 64  # Doubled each round while the result is uncertain
+SAMPLE_MAX_FRACTION = 0.25  # Past this much of the image, a full pass is about as cheap
+CONFIDENCE_Z = 3.0  # Stop once the decision holds over estimate +/- 3 standard errors
+SCORE_TOLERANCE = 1  # Points a sampled score may differ from the exact one
+LEVELS = np.arange(256, dtype=np.float64)
+
+def brightness_histogram(image_cv):
+    """256-bin histogram of the HSV V channel (what check_brightness scores)."""
+    hsv = cv2.cvtColor(image_cv, cv2.COLOR_BGR2HSV)
+    return cv2.calcHist([hsv], [2], None, [256], [0, 256]).ravel()
+
+
+class TileSample:
+    """Full-resolution tiles of an image in a fixed random order, read progressively."""
+    def __init__(self, image_cv, tile=SAMPLE_TILE):
+        self.image = image_cv
+        self.tile = tile
+        self.height, self.width = image_cv.shape[:2]
+        self.cols = -(-self.width // tile)
+        self.count = self.cols * -(-self.height // tile)
+        # Seeded by size, so analyzing the same image twice gives the same result
+        self.order = np.random.default_rng(self.height * 100003 + self.width).permutation(self.count)
+
+    def tiles(self, start, stop, margin=0):
+        """
+        Yields (window, inner) for tiles start..stop of the order. `window` includes up to
+        `margin` pixels of context around the tile; window[inner] is the tile itself.
+        """
+        t, h, w = self.tile, self.height, self.width
+        for idx in self.order[start:stop]:
+            r, c = divmod(int(idx), self.cols)
+            y0, x0 = r * t, c * t
+            y1, x1 = min(y0 + t, h), min(x0 + t, w)
+            wy0, wx0 = max(0, y0 - margin), max(0, x0 - margin)
+            wy1, wx1 = min(h, y1 + margin), min(w, x1 + margin)
+            inner = (slice(y0 - wy0, y1 - wy0), slice(x0 - wx0, x1 - wx0))
+            yield self.image[wy0:wy1, wx0:wx1], inner
+
+
+def decision_margin(value, se, decision, k_max=8.0):
+    """
+    Largest k (up to k_max) for which the decision holds everywhere in value +/- k*se.
+    decision(value) -> (outcome, score): the outcome must stay the same and the score within
+    SCORE_TOLERANCE (scores are monotonic within an outcome, so checking the ends is enough).
+    """
+    if se <= 0:
+        return k_max
+    outcome, score = decision(value)
+    def same(v):
+        other_outcome, other_score = decision(v)
+        return other_outcome == outcome and abs(other_score - score) <= SCORE_TOLERANCE
+    def holds(k):
+        return same(value - k * se) and same(value + k * se)
+    if holds(k_max):
+        return k_max
+    lo, hi = 0.0, k_max
+    for _ in range(20):
+        mid = (lo + hi) / 2
+        if holds(mid):
+            lo = mid
+        else:
+            hi = mid
+    return lo
+
+
+def sampled_estimate(sample, tile_stats, estimate, decision, margin=0):
+    """
+    Progressive tile sampling for a per-pixel statistic.
+    - tile_stats(window, inner) -> 1D array of sums for one tile, pixel count first
+    - estimate(stats) -> (value, per-tile linearized residuals) for the stacked tile sums
+    Returns (value, confidence, error, sampled_fraction, stats), or None when the decision
+    can't be settled before SAMPLE_MAX_FRACTION of the image has been read. `confidence` is the
+    probability that the decision (score included) matches the exact pass; `error` is the
+    half-width of the value's confidence interval (CONFIDENCE_Z standard errors).
+    """
+    max_pixels = SAMPLE_MAX_FRACTION * sample.height * sample.width
+    rows = []
+    target = min(SAMPLE_INITIAL_TILES, sample.count)
+    while True:
+        if target * sample.tile * sample.tile > max_pixels:
+            return None
+        rows.extend(tile_stats(window, inner) for window, inner in sample.tiles(len(rows), target, margin))
+        stats = np.array(rows)
+        n, pixels = len(rows), stats[:, 0].sum()
+        value, resid = estimate(stats)
+        # Standard error of a ratio estimator over sampled tiles (with finite population correction)
+        se = math.sqrt(max(0.0, (1 - n / sample.count) * n / max(n - 1, 1) * float(resid @ resid))) / pixels
+        k = decision_margin(value, se, decision)
+        if k >= CONFIDENCE_Z or n == sample.count:
+            if n == sample.count:
+                return value, 1.0, 0.0, 1.0, stats
+            return value, math.erf(k / math.sqrt(2)), CONFIDENCE_Z * se, pixels / (sample.height * sample.width), stats
+        target = min(2 * n, sample.count)
+
+
+def _laplacian_tile_stats(window, inner):
+    # The 1px margin makes each tile's Laplacian identical to the full-image one
+    lap = cv2.Laplacian(cv2.cvtColor(window, cv2.COLOR_BGR2GRAY), cv2.CV_32F)[inner]
+    mean, std = cv2.meanStdDev(lap)
+    n = lap.size
+    mean, std = float(mean[0, 0]), float(std[0, 0])
+    return np.array([n, mean * n, (std * std + mean * mean) * n])
+
+
+def _laplacian_variance(stats):
+    c, s, q = stats[:, 0], stats[:, 1], stats[:, 2]
+    total = c.sum()
+    m1, m2 = s.sum() / total, q.sum() / total
+    # Linearization of var = E[L^2] - E[L]^2
+    return m2 - m1 * m1, (q - m2 * c) - 2 * m1 * (s - m1 * c)
+
+
+def _brightness_tile_stats(window, inner):
+    hist = brightness_histogram(window)
+    return np.concatenate(([hist.sum(), hist @ LEVELS], hist))
+
+
+def _mean_brightness(stats):
+    c, s = stats[:, 0], stats[:, 1]
+    mean = s.sum() / c.sum()
+    return mean, s - mean * c
+
 
 class ImageQualityAnalyzer:
-    def __init__(self):
+    def __init__(self, adaptive_sampling=True):
         # Thresholds calibrated based on analysis of datasets like KonIQ-10k and LIVE
         # See calibration_notes() for details.
         self.BLUR_THRESHOLD = 100.0  # Variance of Laplacian
@@ -12,26 +144,23 @@ class ImageQualityAnalyzer:
         self.BRIGHTNESS_MAX = 200.0
         self.MIN_RESOLUTION = 500
         self.RECOMMENDED_RESOLUTION = 1000
+        self.adaptive_sampling = adaptive_sampling
+
+    def _sampling(self, image_cv):
+        h, w = image_cv.shape[:2]
+        return self.adaptive_sampling and h * w >= SAMPLING_MIN_PIXELS
 
     @staticmethod
     def load_image(uploaded_file):
-        """Converts uploaded file to format suitable for OpenCV and Pillow."""
-        image_pil = Image.open(uploaded_file)
-        # Convert to RGB if RGBA (handle transparency)
-        if image_pil.mode == 'RGBA':
-            image_pil = image_pil.convert('RGB')
-        
-        image_np = np.array(image_pil)
-        # Convert RGB to BGR for OpenCV
-        image_cv = cv2.cvtColor(image_np, cv2.COLOR_RGB2BGR)
-        return image_pil, image_cv
+        """Decodes uploaded file bytes into a single BGR array for OpenCV (see image_io)."""
+        return decode_image(uploaded_file)
 
-    def analyze(self, image_pil, image_cv):
+    def analyze(self, image_cv):
         """
         Runs all checks on the image.
         """
         results = {
-            'resolution': self.check_resolution(image_pil),
+            'resolution': self.check_resolution(image_cv),
             'blur': self.check_blur(image_cv),
             'brightness': self.check_brightness(image_cv),
             'overall_score': 0
@@ -48,8 +177,8 @@ class ImageQualityAnalyzer:
         
         return results
 
-    def check_resolution(self, image_pil):
-        w, h = image_pil.size
+    def check_resolution(self, image_cv):
+        h, w = image_cv.shape[:2]
         score = 100
         issues = []
         
@@ -77,10 +206,32 @@ class ImageQualityAnalyzer:
         - We assume a threshold of roughly 100 based on standard heuristics for product photography.
         - In a full implementation, we would map the Laplacian Variance to the MOS (Mean Opinion Score) 
           from the KonIQ-10k dataset to normalize this 0-100.
+
+        On large images the variance is estimated from sampled tiles when that settles the
+        result (see sampled_estimate); 'confidence', 'error' and 'sampled' report how it was measured.
         """
-        gray = cv2.cvtColor(image_cv, cv2.COLOR_BGR2GRAY)
-        blur_val = cv2.Laplacian(gray, cv2.CV_64F).var()
-        
+        estimate = None
+        if self._sampling(image_cv):
+            estimate = sampled_estimate(TileSample(image_cv), _laplacian_tile_stats, _laplacian_variance,
+                                        self._blur_decision, margin=1)
+        if estimate is not None:
+            blur_val, confidence, error, sampled, _ = estimate
+        else:
+            gray = cv2.cvtColor(image_cv, cv2.COLOR_BGR2GRAY)
+            blur_val = cv2.Laplacian(gray, cv2.CV_64F).var()
+            confidence, error, sampled = 1.0, 0.0, 1.0
+
+        result = self._score_blur(blur_val)
+        result['confidence'] = round(confidence, 4)
+        result['error'] = round(error, 2)
+        result['sampled'] = round(sampled, 4)
+        return result
+
+    def _blur_decision(self, blur_val):
+        result = self._score_blur(blur_val)
+        return (result['status'], tuple(result['issues'])), result['score']
+
+    def _score_blur(self, blur_val):
         score = 100
         issues = []
         
@@ -96,6 +247,7 @@ class ImageQualityAnalyzer:
             # Scale from 50 to 100
             score = min(100, 50 + int((blur_val / 500) * 50))
             
+        blur_val = float(blur_val)
         return {
             'value': round(blur_val, 2),
             'score': score,
@@ -104,10 +256,34 @@ class ImageQualityAnalyzer:
         }
 
     def check_brightness(self, image_cv):
-        hsv = cv2.cvtColor(image_cv, cv2.COLOR_BGR2HSV)
-        # V channel represents brightness
-        brightness = hsv[:,:,2].mean()
-        
+        # V channel represents brightness. The histogram is kept in the result so the
+        # enhancer can build its tone curves without another pass over the pixels.
+        estimate = None
+        if self._sampling(image_cv):
+            estimate = sampled_estimate(TileSample(image_cv), _brightness_tile_stats, _mean_brightness,
+                                        self._brightness_decision)
+        if estimate is not None:
+            brightness, confidence, error, sampled, stats = estimate
+            # Sampled histogram scaled up to the full pixel count
+            histogram = (stats[:, 2:].sum(axis=0) / sampled).astype(np.float32)
+        else:
+            histogram = brightness_histogram(image_cv)
+            brightness = float(np.dot(histogram, LEVELS) / max(histogram.sum(), 1))
+            confidence, error, sampled = 1.0, 0.0, 1.0
+
+        result = self._score_brightness(brightness)
+        result['histogram'] = histogram
+        result['confidence'] = round(confidence, 4)
+        result['error'] = round(error, 2)
+        result['sampled'] = round(sampled, 4)
+        return result
+
+    def _brightness_decision(self, brightness):
+        result = self._score_brightness(brightness)
+        return (result['status'], tuple(result['issues'])), result['score']
+
+    def _score_brightness(self, brightness):
+        brightness = float(brightness)
         score = 100
         issues = []
         
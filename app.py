@@ -1,11 +1,15 @@
 import streamlit as st
 import pandas as pd
-from analysis import ImageQualityAnalyzer
-import io
-import cv2
-from PIL import Image
+from analysis import ImageQualityAnalyzer, SCORE_TOLERANCE
+from image_cache import ImageCache, ANALYSIS_POLL_INTERVAL, collect_batch, content_key
+from scheduler import TaskScheduler, QueueFullError
+from artifact_store import ArtifactExpiredError
+from image_io import encode_image
+from reports import bulk_summary_rows, bulk_report_zip, bulk_image_jpeg, bulk_image_zip
+from enhancement import ImageEnhancer, PROCESS_ALL_OPERATIONS
 import time
-import zipfile
+import functools
+import db_manager
 
 # --- Page Configuration ---
 st.set_page_config(
@@ -75,6 +79,12 @@ if 'user_tier' not in st.session_state:
     st.session_state.user_tier = 'Free'
 
 FREE_LIMIT = 5
+# Relative task sizes for the fair scheduler (an analysis = 1)
+RENDER_COST = 1.0
+UPSCALE_COST = 5.0
+# Upscale quality choices -> superres mode ('fast' runs FSRCNN on detailed areas only)
+UPSCALE_MODES = {"Best quality": 'full', "Fast": 'fast'}
+UPSCALE_OPERATIONS = ('upscale', 'upscale_fast')
 
 # --- Utils ---
 def get_score_color(score):
@@ -96,7 +106,94 @@ def generate_csv(results):
     df = pd.DataFrame(data)
     return df.to_csv(index=False).encode('utf-8')
 
-analyzer = ImageQualityAnalyzer()
+# --- Shared Resources (one instance per server process, not per rerun) ---
+@st.cache_resource
+def get_analyzer():
+    return ImageQualityAnalyzer()
+
+@st.cache_resource
+def get_enhancer():
+    return ImageEnhancer()
+
+@st.cache_resource
+def get_scheduler():
+    return TaskScheduler()
+
+@st.cache_resource(ttl=24 * 60 * 60)
+def schedule_history_pruning():
+    # History retention runs as a background task, at most once a day per server process
+    return get_scheduler().submit(db_manager.prune_analysis_history, user='maintenance', tier='Free')
+
+analyzer = get_analyzer()
+scheduler = get_scheduler()
+schedule_history_pruning()
+
+# Decoded images, analysis results and enhanced outputs for this session
+if 'image_cache' not in st.session_state:
+    st.session_state.image_cache = ImageCache()
+image_cache = st.session_state.image_cache
+
+# --- Background Downloads ---
+# Full-resolution renders and ZIP builds are prepared on the fair scheduler, never inside a
+# download click: the click handler runs on a shared executor thread, and waiting there on a
+# busy queue would stall every other session's downloads. A small fragment polls the job, and
+# the download button appears once the result is ready and serves it without waiting.
+# Jobs return ArtifactHandles: the output waits in the artifact store (spilled to disk when
+# large), and session state holds only the handle. Outputs left unread for the store's TTL
+# are dropped and the user is asked to prepare them again. A click that races the expiry
+# fails at once (the click handler never waits on the queue), and the rerun that every
+# download click triggers shows the same "prepare again" message.
+@st.fragment(run_every=ANALYSIS_POLL_INTERVAL)
+def download_progress(slot, message):
+    job = st.session_state.download_jobs.get(slot)
+    if job is None or job['future'].done():
+        st.rerun()
+    st.info(f"⏳ {message} ({time.monotonic() - job['started']:.0f}s). You can keep working; "
+            "the download button appears here when it is ready.")
+
+def prepared_download(slot, job_key, start, prepare_label, download_label, file_name, mime):
+    """
+    Prepare-then-download button pair for output that is expensive to build.
+    start() queues the build on the scheduler and returns its Future (resolving to an ArtifactHandle).
+    `job_key` identifies the output; when it changes (e.g. other tools or files) the old job is dropped.
+    """
+    jobs = st.session_state.setdefault('download_jobs', {})
+    job = jobs.get(slot)
+    if job is not None and job['key'] != job_key:
+        job['future'].cancel()  # Only takes effect while still queued
+        del jobs[slot]
+        job = None
+    expired = (job is not None and job['future'].done() and job['future'].exception() is None
+               and not job['future'].result().alive)
+    if expired:
+        del jobs[slot]
+        job = None
+
+    if job is None:
+        if expired:
+            st.warning(f"The prepared {file_name} expired after a period of inactivity. Please prepare it again.")
+        if not st.button(prepare_label, key=f"prepare_{slot}"):
+            return
+        try:
+            future = start()
+        except QueueFullError as e:
+            st.error(str(e))
+            return
+        job = jobs[slot] = {'key': job_key, 'future': future, 'started': time.monotonic()}
+
+    future = job['future']
+    if not future.done():
+        download_progress(slot, f"Preparing {file_name}")
+        return
+    if future.exception() is not None:
+        st.error(f"Could not prepare {file_name}: {future.exception()}")
+        if st.button("Try again", key=f"retry_{slot}"):
+            del jobs[slot]
+            st.rerun()
+        return
+    # The job is finished, so the deferred callable only reads the stored output back
+    # (raising ArtifactExpiredError if it expired since this rerun)
+    st.download_button(download_label, future.result().get, file_name, mime, key=f"download_{slot}")
 
 # --- Sidebar ---
 with st.sidebar:
@@ -131,11 +228,29 @@ from auth_manager import GoogleAuth
 
 # --- Auth Logic & Routing ---
 auth = GoogleAuth()
+# Cookies written / cleared by the previous run (login, sign-out)
+auth.sync_cookies()
+
+def start_session(user_data):
+    """Logs the user in with a server-side session (cookie token) so reloads stay logged in."""
+    auth.start_session(user_data)
+    st.query_params.clear()
+    st.rerun()
+
 # Handle Google OAuth redirect or Email Session
 user_info = auth.get_user_info()
 if user_info:
-    st.session_state.user = user_info
-    st.rerun()
+    start_session(user_info)
+
+# Restore a previous login from its session cookie (no password check or DB sync needed).
+# Tried once per browser session: the cookie can't change until the page reconnects.
+if st.session_state.get('user') is None and not st.session_state.get('session_restore_tried'):
+    st.session_state.session_restore_tried = True
+    restored_user = auth.restore_session()
+    if restored_user:
+        st.session_state.user = restored_user
+    else:
+        auth.sync_cookies()  # A stale cookie is cleared right away
 
 # Determine Current Page/Mode
 if 'mode' not in st.session_state:
@@ -190,9 +305,7 @@ if 'user' not in st.session_state or st.session_state.user is None:
                     if submit:
                         success, result = auth.login_user(email, password)
                         if success:
-                            st.session_state.user = result
-                            st.query_params.clear()
-                            st.rerun()
+                            start_session(result)
                         else:
                             st.error(result)
                 
@@ -299,6 +412,8 @@ if 'user' not in st.session_state or st.session_state.user is None:
 
 else:
     # --- LOGGED IN DASHBOARD ---
+    # Identifies this user's flow in the fair scheduler
+    user_id = st.session_state.user.get('email') or st.session_state.user.get('name')
     
     # User Profile in Sidebar
     with st.sidebar:
@@ -312,6 +427,8 @@ else:
              st.caption(st.session_state.user.get('email'))
              
         if st.button("Sign Out", type="secondary", use_container_width=True):
+            # Cancel this session's queued analyses and free its images now, not at garbage collection
+            image_cache.clear()
             auth.sign_out()
     
     # --- Sidebar ---
@@ -345,10 +462,67 @@ else:
         with st.expander("How this works?"):
             st.markdown(analyzer.calibration_explanation())
 
+        with st.expander("📊 Processing Queue"):
+            queue_stats = scheduler.stats()
+            st.caption(f"{queue_stats['queued']} tasks queued")
+            for tier, t in sorted(queue_stats['tiers'].items()):
+                st.caption(f"**{tier}**: {t['running']} running, {t['queued']} queued, "
+                           f"wait p50 {t.get('wait_p50', 0):.2f}s / p95 {t.get('wait_p95', 0):.2f}s")
+            store_stats = image_cache.store.stats()
+            st.caption(f"**Artifacts**: {store_stats['artifacts']} ({store_stats['spilled']} spilled), "
+                       f"{store_stats['memory_bytes'] / 2**20:.0f} MB in memory / {store_stats['disk_bytes'] / 2**20:.0f} MB on disk")
+
     # --- Main Page ---
     st.markdown('<div class="main-header">E-commerce Image Quality Checker</div>', unsafe_allow_html=True)
     st.markdown("Optimize your product listings with AI-powered quality analysis.")
 
+    # --- Analysis History ---
+    @st.fragment
+    def analysis_history_view():
+        """Paged history of this user's checks. Paging reruns only this fragment."""
+        score_range = st.slider("Overall score", 0, 100, (0, 100), key="history_score_range")
+        if st.session_state.get('history_filter') != score_range:
+            # Cursors of pages visited so far; a new filter starts again from the newest page
+            st.session_state.history_filter = score_range
+            st.session_state.history_cursors = [None]
+        cursors = st.session_state.history_cursors
+
+        # The full 0-100 range is no filter at all: skip the score conditions
+        min_score = score_range[0] if score_range[0] > 0 else None
+        max_score = score_range[1] if score_range[1] < 100 else None
+        rows, next_cursor = db_manager.get_analysis_history(
+            user_id, before=cursors[-1], min_score=min_score, max_score=max_score)
+        if not rows:
+            st.caption("No checks recorded yet.")
+            return
+
+        trend = db_manager.get_score_trend(user_id, days=30)
+        if len(trend) > 1:
+            st.caption("Average overall score per day (last 30 days)")
+            st.line_chart(pd.DataFrame(trend).set_index('day')['overall_score'])
+
+        st.dataframe(pd.DataFrame([{
+            "Checked": r['created_at'],
+            "Filename": r['filename'],
+            "Overall Score": r['overall_score'],
+            "Resolution": f"{r['width']}x{r['height']}",
+            "Blur Status": r['blur_status'],
+            "Brightness Status": r['brightness_status']
+        } for r in rows]), use_container_width=True, hide_index=True)
+
+        h_col1, h_col2, h_col3 = st.columns([1, 1, 2])
+        with h_col1:
+            st.button("← Newer", key="history_newer", disabled=len(cursors) == 1,
+                      on_click=lambda: cursors.pop())
+        with h_col2:
+            st.button("Older →", key="history_older", disabled=next_cursor is None,
+                      on_click=lambda: cursors.append(next_cursor))
+        with h_col3:
+            st.caption(f"Page {len(cursors)}")
+
+    with st.expander("📈 Analysis History"):
+        analysis_history_view()
+
     # Pro Feature: Bulk Upload
     accept_multiple = is_premium
     upload_label = "Upload Product Image(s)" if is_premium else "Upload Product Image (Upgrade for Bulk)"
@@ -359,51 +533,67 @@ else:
         if not isinstance(uploaded_files, list):
             uploaded_files = [uploaded_files]
 
-        # Check Limit (Free users capped at 5 daily, already checked in logic but need to enforce total count here)
-        if not is_premium:
-            if st.session_state.daily_checks + len(uploaded_files) > FREE_LIMIT:
+        # Enforce single file strictly if somehow multiple got through
+        if not is_premium and len(uploaded_files) > 1:
+            st.warning("Free plan supports single processing only. Analyzing the first image...")
+            uploaded_files = [uploaded_files[0]]
+
+        # Check Limit (Free users capped at 5 daily). Images already analyzed this session don't count again.
+        new_files = [f for f in uploaded_files if content_key(f) not in image_cache]
+        if not is_premium and new_files:
+            if st.session_state.daily_checks + len(new_files) > FREE_LIMIT:
                  st.error(f"Daily limit reached ({FREE_LIMIT}). Upgrade to Pro for unlimited checks.")
                  st.stop()
-            
-            # Enforce single file strictly if somehow multiple got through
-            if len(uploaded_files) > 1:
-                st.warning("Free plan supports single processing only. Analyzing the first image...")
-                uploaded_files = [uploaded_files[0]]
 
-        # Processing Setup
-        results_list = []
-        
-        # Progress UI
-        if len(uploaded_files) > 1:
-            progress_bar = st.progress(0)
-            status_text = st.empty()
-        
-        # --- ANALYSIS LOOP ---
-        for idx, uploaded_file in enumerate(uploaded_files):
-            
-            # processing speed simulation
-            if not is_premium:
-                with st.spinner(f"Standard Processing ({uploaded_file.name})..."):
-                    time.sleep(1.5) # Artificial delay for standard tier
-            else:
-                 # Pro Speed indication
-                 pass # Instant
+        # --- ANALYSIS (background) ---
+        # Decode + analysis run on the shared scheduler so this script thread never blocks on CPU work.
+        # The scheduler shares workers fairly between users, weighted by tier (Pro gets a larger share).
+        submit_task = functools.partial(scheduler.submit, user=user_id, tier=st.session_state.user_tier)
+        try:
+            cache_keys = [image_cache.request_analysis(f, analyzer, submit_task) for f in uploaded_files]
+        except QueueFullError as e:
+            st.error(str(e))
+            st.stop()
+
+        def collect_results():
+            """Moves finished analyses into the cache; returns the list of entries (None = still running)."""
+            try:
+                entries, finished = collect_batch(image_cache, cache_keys, [f.name for f in uploaded_files])
+            except Exception as e:
+                st.error(f"Could not analyze image: {e}")
+                st.stop()
+            # History (one bulk insert per poll) + usage: Free users are charged once per newly analyzed image
+            daily_checks = db_manager.record_analyses(user_id, finished, None if is_premium else st.session_state.daily_checks)
+            if daily_checks is not None:
+                st.session_state.daily_checks = daily_checks
+            return entries
 
-            # Load & Analyze
-            image_pil, image_cv = analyzer.load_image(uploaded_file)
-            result = analyzer.analyze(image_pil, image_cv)
+        @st.fragment(run_every=ANALYSIS_POLL_INTERVAL)
+        def analysis_progress():
+            # Re-runs on its own until every image is done, then reruns the full page for the results
+            entries = collect_results()
+            done = [(f, e) for f, e in zip(uploaded_files, entries) if e is not None]
+            if len(done) == len(entries):
+                st.rerun()
+
+            label = "Priority Processing" if is_premium else "Standard Processing"
+            st.progress(len(done) / len(entries), text=f"{label}: {len(done)}/{len(entries)} images analyzed...")
+            if done:
+                # Incremental results while the rest of the batch is still running
+                st.dataframe(pd.DataFrame([
+                    {"Filename": f.name, "Overall Score": e.results['overall_score']} for f, e in done
+                ]), use_container_width=True)
+
+        entries = collect_results()
+        if any(e is None for e in entries):
+            analysis_progress()
+            st.stop()
+
+        results_list = []
+        for uploaded_file, entry in zip(uploaded_files, entries):
+            result = dict(entry.results)
             result['filename'] = uploaded_file.name
             results_list.append(result)
-            
-            # Update usage (approximate)
-            if not is_premium:
-                st.session_state.daily_checks += 1
-                # PERSIST TO DB
-                if st.session_state.user:
-                    import db_manager
-                    db_manager.update_user_checks(st.session_state.user.get('email'), st.session_state.daily_checks)
-            if len(uploaded_files) > 1:
-                progress_bar.progress((idx + 1) / len(uploaded_files))
 
         # --- RESULTS DISPLAY ---
         st.markdown("---")
@@ -447,6 +637,14 @@ else:
                 if result['brightness']['issues']: st.warning(result['brightness']['issues'][0])
                 else: st.success("Balanced Light")
 
+            # Large images are scored from sampled tiles when the result is clear-cut
+            sampled = min(result['blur']['sampled'], result['brightness']['sampled'])
+            if sampled < 1:
+                confidence = min(result['blur']['confidence'], result['brightness']['confidence'])
+                st.caption(f"⚡ Large image: focus and brightness estimated from {sampled:.0%} of the pixels "
+                           f"(brightness ±{result['brightness']['error']}, focus ±{result['blur']['error']}); "
+                           f"scores within ±{SCORE_TOLERANCE} of the exact check (confidence {confidence:.1%}).")
+
             # --- Report Download ---
             st.markdown("### 📥 Report")
             csv_data = generate_csv(result)
@@ -458,36 +656,57 @@ else:
             
             if is_premium:
                 st.caption("⚡ Pro Features Unlocked: Auto-fix, Smart Upscale, Sharpening")
-                from enhancement import ImageEnhancer
-                enhancer = ImageEnhancer()
+                enhancer = get_enhancer()
+                cache_key = cache_keys[0]
+                # Reuse the analyzer's brightness histogram for the tone curves
+                histogram = result['brightness']['histogram']
                 
                 # Use 'key' to avoid collisions if re-running
-                # Logic: We use a session state holder for the currently processed enhanced image
-                if 'enhanced_image' not in st.session_state or st.session_state.get('last_processed_file') != result['filename']:
-                    st.session_state.enhanced_image = None
+                # Logic: buttons only record the operation chain. The chain is previewed on a
+                # screen-sized proxy and rendered at full resolution only when downloading.
+                if 'enhance_ops' not in st.session_state or st.session_state.get('last_processed_file') != result['filename']:
+                    st.session_state.enhance_ops = None
                     st.session_state.last_processed_file = result['filename']
 
+                def render_preview(ops):
+                    return image_cache.get_enhanced(cache_key, ops, lambda img: enhancer.render(img, ops, histogram, preview=True), preview=True)
+
+                def render_full_resolution(ops):
+                    # Runs as a scheduler task (see prepared_download), so the render itself never waits on the queue
+                    try:
+                        full = image_cache.get_enhanced(cache_key, ops, lambda img: enhancer.render(img, ops, histogram))
+                    except KeyError:
+                        # Evicted from the session cache, or expired from the artifact store: decode the upload again
+                        full = enhancer.render(analyzer.load_image(uploaded_files[0]), ops, histogram)
+                    return image_cache.store.put_bytes(encode_image(full, '.jpg', quality=95))
+
                 e_col1, e_col2 = st.columns([1, 2])
                 with e_col1:
+                    # Previews are cached per operation chain, so switching tools never re-decodes or re-runs
                     if st.button("💡 Fix Brightness", key="fix_bright"):
-                        processed = enhancer.fix_brightness(image_cv)
-                        st.session_state.enhanced_image = cv2.cvtColor(processed, cv2.COLOR_BGR2RGB)
+                        st.session_state.enhance_ops = ('brightness',)
+                    upscale_mode = UPSCALE_MODES[st.radio("Upscale mode", list(UPSCALE_MODES), key="upscale_mode", horizontal=True)]
                     if st.button("🔍 Smart Upscale (AI)", key="upscale"):
-                        with st.spinner("AI Upscaling..."):
-                            processed = enhancer.enhance_resolution(image_cv) # FSRCNN
-                            st.session_state.enhanced_image = cv2.cvtColor(processed, cv2.COLOR_BGR2RGB)
+                        # FSRCNN on download
+                        st.session_state.enhance_ops = ('upscale_fast',) if upscale_mode == 'fast' else ('upscale',)
                     if st.button("✨ Fix All Automatically", type="primary", key="fix_all"):
-                        processed = enhancer.process_all(image_cv)
-                        st.session_state.enhanced_image = cv2.cvtColor(processed, cv2.COLOR_BGR2RGB)
+                        st.session_state.enhance_ops = PROCESS_ALL_OPERATIONS
                 
                 with e_col2:
-                    if st.session_state.enhanced_image is not None:
-                        st.image(st.session_state.enhanced_image, caption="Enhanced Version", use_container_width=True)
-                        # Image Download
-                        img_out = Image.fromarray(st.session_state.enhanced_image)
-                        buf = io.BytesIO()
-                        img_out.save(buf, format="JPEG", quality=95)
-                        st.download_button("⬇️ Download Enhanced Image", buf.getvalue(), f"enhanced_{result['filename']}", "image/jpeg")
+                    ops = st.session_state.enhance_ops
+                    if ops is not None:
+                        # Kept in BGR end-to-end: no cvtColor / PIL copies for display or download
+                        caption = "Preview (AI upscaling is applied to the download)" if set(UPSCALE_OPERATIONS) & set(ops) else "Preview"
+                        st.image(render_preview(ops), caption=caption, channels="BGR", use_container_width=True)
+                        # Image Download (full resolution, rendered in the background on request)
+                        prepared_download(
+                            'enhanced', (cache_key, ops),
+                            functools.partial(scheduler.submit, render_full_resolution, ops, user=user_id,
+                                              tier=st.session_state.user_tier,
+                                              cost=UPSCALE_COST if set(UPSCALE_OPERATIONS) & set(ops) else RENDER_COST),
+                            prepare_label="⚙️ Prepare Full-Resolution Image",
+                            download_label="⬇️ Download Enhanced Image",
+                            file_name=f"enhanced_{result['filename']}", mime="image/jpeg")
                     else:
                         st.info("Select an enhancement tool.")
             else:
@@ -511,38 +730,60 @@ else:
             st.success(f"✅ Analyzed {len(uploaded_files)} images successfully.")
             
             # Summary Table
-            summary_data = []
-            for r in results_list:
-                summary_data.append({
-                    "Filename": r['filename'],
-                    "Overall Score": r['overall_score'],
-                    "Resolution": f"{r['resolution']['width']}x{r['resolution']['height']}",
-                    "Blur Status": r['blur']['status'],
-                    "Brightness Status": r['brightness']['status']
-                })
+            summary_data = bulk_summary_rows(results_list)
             st.dataframe(pd.DataFrame(summary_data), use_container_width=True)
             
             # Bulk Download Reports (ZIP)
             st.markdown("### 📥 Bulk Download")
-            
-            # Create ZIP in memory
-            zip_buffer = io.BytesIO()
-            with zipfile.ZipFile(zip_buffer, "w") as zf:
-                # Add combined CSV
-                combined_csv = pd.DataFrame(summary_data).to_csv(index=False)
-                zf.writestr("summary_report.csv", combined_csv)
-                
-                # Add individual CSVs? Maybe just one summary is enough.
-                # Let's simple add summary.
-            
             st.download_button(
                 label="Download Summary Report (ZIP)",
-                data=zip_buffer.getvalue(),
+                data=bulk_report_zip(summary_data),
                 file_name="bulk_analysis_report.zip",
                 mime="application/zip"
             )
-            
-            st.info("💡 Bulk AI Enhancement is available in the API version (Coming Soon).")
+
+            # Bulk AI Upscale: one background task per image, then one that writes the ZIP
+            st.markdown("### ✨ Bulk Enhancement")
+            enhancer = get_enhancer()
+            # Handles, not pixels: the tasks read each image back from the artifact store
+            # (the shares keep them alive if the session cache evicts the entries meanwhile)
+            images = [(entry.image.share(), f, f"upscaled_{f.name}") for entry, f in zip(entries, uploaded_files)]
+            bulk_upscale_mode = UPSCALE_MODES[st.radio("Upscale mode", list(UPSCALE_MODES), key="bulk_upscale_mode", horizontal=True)]
+
+            def load_source(handle, upload):
+                try:
+                    return handle.get()
+                except ArtifactExpiredError:
+                    # Expired from the artifact store while the job waited: decode the upload again
+                    return analyzer.load_image(upload)
+
+            def upscale_jpegs(chunk):
+                pixels = (load_source(handle, upload) for handle, upload, _ in chunk)
+                return [bulk_image_jpeg(upscaled) for upscaled in enhancer.upscale_many(pixels, bulk_upscale_mode)]
+
+            def upscale_chunk(chunk):
+                # One scheduler task per image, so other users' work interleaves with a large batch
+                return [(item, image_cache.store.put_bytes(jpeg)) for item, jpeg in zip(chunk, upscale_jpegs(chunk))]
+
+            def stored_jpeg(item, jpeg):
+                try:
+                    return jpeg.get()
+                except ArtifactExpiredError:
+                    # Expired while the rest of the batch was queued: upscale this image again
+                    return upscale_jpegs([item])[0]
+
+            def write_upscaled_zip(chunks):
+                # The JPEGs are already encoded; the ZIP goes straight into a spill file, one entry at a time
+                named_jpegs = ((item[2], stored_jpeg(item, jpeg)) for chunk in chunks for item, jpeg in chunk)
+                return image_cache.store.put_file(lambda f: bulk_image_zip(named_jpegs, fileobj=f), suffix='.zip')
+
+            prepared_download(
+                'upscaled_zip', (tuple(cache_keys), bulk_upscale_mode),
+                functools.partial(scheduler.submit_chunks, upscale_chunk, images, write_upscaled_zip,
+                                  user=user_id, tier=st.session_state.user_tier, cost=UPSCALE_COST),
+                prepare_label=f"⚙️ Upscale All {len(images)} Images 3x (AI, ZIP)",
+                download_label="⬇️ Download Upscaled Images (ZIP)",
+                file_name="upscaled_images.zip", mime="application/zip")
 
     else:
         # Empty State
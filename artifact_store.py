@@ -0,0 +1,267 @@
+import atexit
+import itertools
+import os
+import shutil
+import tempfile
+import threading
+import time
+import weakref
+from collections import OrderedDict
+import numpy as np
+
+# --- Artifact Store ---
+# Decoded images, upscaled outputs and other large intermediates are spilled
+# to memory-mapped files in a per-process temp directory. Sessions hold only
+# small ArtifactHandle objects. Spilled pages are file-backed, so the OS can
+# drop them under memory pressure, and process memory stays bounded however
+# many images users upscale.
+# - Reference counted: an artifact is deleted once every handle to it has been
+#   released (explicitly, or when the handle is garbage collected).
+# - TTL: artifacts not read for ARTIFACT_TTL are deleted even while referenced
+#   (abandoned sessions never release). Their handles then report alive=False,
+#   reads raise ArtifactExpiredError, and callers recompute.
+SPILL_DIR = os.path.join(tempfile.gettempdir(), "image_quality_artifacts")
+SPILL_MIN_BYTES = 8 * 1024 * 1024  # Smaller artifacts stay in memory...
+MAX_MEMORY_BYTES = 256 * 1024 * 1024  # ...until these add up to this much, then everything spills
+MAX_DISK_BYTES = 8 * 1024 * 1024 * 1024  # Least recently used artifacts are evicted beyond this
+ARTIFACT_TTL = 30 * 60  # seconds since last access
+SWEEP_INTERVAL = 60  # seconds between TTL sweeps (done lazily on store calls)
+
+
+class ArtifactExpiredError(KeyError):
+    """The artifact behind a handle has been released, or evicted by the TTL / disk budget."""
+
+
+class ArtifactHandle:
+    """A reference to one stored artifact. Cheap to keep in session state."""
+    __slots__ = ('key', 'kind', 'nbytes', '_store', '_finalizer', '__weakref__')
+
+    def __init__(self, store, key, kind, nbytes):
+        self.key = key
+        self.kind = kind  # 'array' or 'bytes'
+        self.nbytes = nbytes
+        self._store = store
+        self._finalizer = weakref.finalize(self, store._release, key)
+
+    def get(self):
+        """The artifact's value (spilled arrays come back as read-only np.memmap). Raises ArtifactExpiredError once evicted."""
+        return self._store.get(self)
+
+    @property
+    def alive(self):
+        return self._finalizer.alive and self._store.contains(self.key)
+
+    def share(self):
+        """Another handle to the same artifact (counts as a reference of its own)."""
+        return self._store._share(self)
+
+    def release(self):
+        """Drops this reference now instead of at garbage collection; safe to call twice."""
+        self._finalizer()
+
+
+class _Artifact:
+    __slots__ = ('kind', 'value', 'path', 'nbytes', 'refs', 'last_access')
+
+    def __init__(self, kind, value, path, nbytes):
+        self.kind = kind
+        self.value = value  # In-memory value, or None when spilled
+        self.path = path  # Spill file, or None when in memory
+        self.nbytes = nbytes
+        self.refs = 1
+        self.last_access = time.monotonic()
+
+
+class ArtifactStore:
+    def __init__(self, directory=None, spill_min_bytes=SPILL_MIN_BYTES, max_memory_bytes=MAX_MEMORY_BYTES,
+                 max_disk_bytes=MAX_DISK_BYTES, ttl=ARTIFACT_TTL):
+        self.directory = directory or os.path.join(SPILL_DIR, str(os.getpid()))
+        self.spill_min_bytes = spill_min_bytes
+        self.max_memory_bytes = max_memory_bytes
+        self.max_disk_bytes = max_disk_bytes
+        self.ttl = ttl
+        self._items = OrderedDict()  # key -> _Artifact, least recently used first
+        self._memory_bytes = 0
+        self._disk_bytes = 0
+        self._ids = itertools.count()
+        self._lock = threading.Lock()
+        self._last_sweep = time.monotonic()
+        os.makedirs(self.directory, exist_ok=True)
+
+    # --- Storing ---
+    def put_array(self, array):
+        """Stores a NumPy array and returns a handle to it."""
+        array = np.asarray(array)
+        if not self._should_spill(array.nbytes):
+            return self._add('array', array, None, array.nbytes)
+        path = self._new_path('.npy')
+        # A plain write (no msync): reads map the same page cache, so nothing waits on the disk
+        with open(path, 'wb') as f:
+            np.save(f, array, allow_pickle=False)
+        return self._add('array', None, path, array.nbytes)
+
+    def put_bytes(self, data):
+        """Stores encoded output (e.g. a JPEG or ZIP) and returns a handle to it."""
+        data = bytes(data)
+        if not self._should_spill(len(data)):
+            return self._add('bytes', data, None, len(data))
+        path = self._new_path('.bin')
+        with open(path, 'wb') as f:
+            f.write(data)
+        return self._add('bytes', None, path, len(data))
+
+    def put_file(self, write, suffix='.bin'):
+        """
+        Stores output produced by write(fileobj) straight into a spill file and returns a handle to it,
+        for output that is too large to build in memory first (e.g. a ZIP written entry by entry).
+        """
+        path = self._new_path(suffix)
+        try:
+            with open(path, 'wb') as f:
+                write(f)
+                nbytes = f.tell()
+        except BaseException:
+            self._delete_files([path])
+            raise
+        return self._add('bytes', None, path, nbytes)
+
+    def _should_spill(self, nbytes):
+        with self._lock:
+            return nbytes >= self.spill_min_bytes or self._memory_bytes + nbytes > self.max_memory_bytes
+
+    def _new_path(self, suffix):
+        return os.path.join(self.directory, f"{next(self._ids)}{suffix}")
+
+    def _add(self, kind, value, path, nbytes):
+        with self._lock:
+            key = path or f"mem:{next(self._ids)}"
+            self._items[key] = _Artifact(kind, value, path, nbytes)
+            if path:
+                self._disk_bytes += nbytes
+            else:
+                self._memory_bytes += nbytes
+            doomed = self._over_budget(keep=key) + self._expired()
+        self._delete_files(doomed)
+        return ArtifactHandle(self, key, kind, nbytes)
+
+    # --- Reading ---
+    def get(self, handle):
+        with self._lock:
+            item = self._items.get(handle.key) if handle._finalizer.alive else None
+            if item is None:
+                raise ArtifactExpiredError(f"Artifact {handle.key} has been released or evicted")
+            item.last_access = time.monotonic()
+            self._items.move_to_end(handle.key)
+            doomed = self._expired()
+        self._delete_files(doomed)
+        if item.path is None:
+            return item.value
+        if item.kind == 'array':
+            return np.load(item.path, mmap_mode='r')
+        with open(item.path, 'rb') as f:
+            return f.read()
+
+    def contains(self, key):
+        with self._lock:
+            return key in self._items
+
+    # --- References / Eviction ---
+    def _share(self, handle):
+        with self._lock:
+            item = self._items.get(handle.key)
+            if item is None:
+                raise ArtifactExpiredError(f"Artifact {handle.key} has been released or evicted")
+            item.refs += 1
+        return ArtifactHandle(self, handle.key, handle.kind, handle.nbytes)
+
+    def _release(self, key):
+        doomed = []
+        with self._lock:
+            item = self._items.get(key)
+            if item is not None:
+                item.refs -= 1
+                if item.refs <= 0:
+                    doomed = self._remove(key)
+        self._delete_files(doomed)
+
+    def _remove(self, key):
+        """Drops an artifact from the index (lock held); returns the file to delete, if any."""
+        item = self._items.pop(key)
+        if item.path:
+            self._disk_bytes -= item.nbytes
+            return [item.path]
+        self._memory_bytes -= item.nbytes
+        return []
+
+    def _expired(self):
+        now = time.monotonic()
+        if now - self._last_sweep < SWEEP_INTERVAL:
+            return []
+        self._last_sweep = now
+        doomed = []
+        for key in [k for k, item in self._items.items() if now - item.last_access > self.ttl]:
+            doomed += self._remove(key)
+        return doomed
+
+    def _over_budget(self, keep=None):
+        doomed = []
+        for key in list(self._items):
+            if self._disk_bytes <= self.max_disk_bytes:
+                break
+            if key != keep and self._items[key].path:
+                doomed += self._remove(key)
+        return doomed
+
+    @staticmethod
+    def _delete_files(paths):
+        for path in paths:
+            try:
+                os.remove(path)
+            except OSError:
+                pass  # Still mapped on some platforms; the directory is removed at exit
+
+    # --- Metrics / Cleanup ---
+    def stats(self):
+        with self._lock:
+            return {
+                'artifacts': len(self._items),
+                'spilled': sum(1 for item in self._items.values() if item.path),
+                'memory_bytes': self._memory_bytes,
+                'disk_bytes': self._disk_bytes,
+            }
+
+    def close(self):
+        with self._lock:
+            self._items.clear()
+            self._memory_bytes = self._disk_bytes = 0
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+
+def _remove_stale_dirs():
+    """Deletes spill directories left behind by processes that are no longer running."""
+    if not os.path.isdir(SPILL_DIR):
+        return
+    for name in os.listdir(SPILL_DIR):
+        if not name.isdigit() or int(name) == os.getpid():
+            continue
+        try:
+            os.kill(int(name), 0)
+        except ProcessLookupError:
+            shutil.rmtree(os.path.join(SPILL_DIR, name), ignore_errors=True)
+        except OSError:
+            pass  # Exists but owned by someone else
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    """The process-wide ArtifactStore (created on first use, removed at exit)."""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _remove_stale_dirs()
+            _store = ArtifactStore()
+            atexit.register(_store.close)
+        return _store
@@ -1,14 +1,145 @@
 import streamlit as st
-import google.oauth2.credentials
-from google_auth_oauthlib.flow import Flow
 import os
+import hashlib
+import hmac
+import json
+import math
+import secrets
+import threading
+import time
+from collections import OrderedDict
 from werkzeug.security import generate_password_hash, check_password_hash
 import db_manager
+from rate_limiter import TokenBucketLimiter
+from oauth_client import get_oauth_client, LOGIN_STATE_TTL
 
 # --- Google OAuth Configuration ---
 # Redirect URI must match what is in Google Console and secrets.toml
 AUTH_REDIRECT_URI = "http://localhost:8501" 
 
+# --- Email/Password Security Settings ---
+# Explicit hashing parameters (OWASP-recommended PBKDF2 iteration count) instead of library defaults
+PASSWORD_HASH_METHOD = "pbkdf2:sha256:600000"
+# Failed login attempts: token buckets per client IP and per email (burst, then refill rate)
+LOGIN_IP_LIMITER = TokenBucketLimiter("login_ip", capacity=20, refill_per_second=1 / 15)
+LOGIN_EMAIL_LIMITER = TokenBucketLimiter("login_email", capacity=5, refill_per_second=1 / 60)
+# Reverse proxies / load balancers whose X-Forwarded-For header is trusted (comma-separated IPs)
+TRUSTED_PROXIES = {ip.strip() for ip in os.getenv("TRUSTED_PROXIES", "").split(",") if ip.strip()}
+# Login sessions: an opaque random token in a cookie, looked up server-side, lets a
+# reload restore the login without re-verifying the password. Sign-out revokes it.
+SESSION_TOKEN_TTL = 12 * 60 * 60  # seconds
+SESSION_COOKIE = "iq_session"
+# The state of a Google login in progress; the OAuth callback must bring the same value back
+OAUTH_STATE_COOKIE = "iq_oauth_state"
+VERIFY_CACHE_SIZE = 1024
+
+
+def _load_session_secret():
+    # Keys the password-check cache below. A configured secret keeps it stable across restarts
+    try:
+        secret = st.secrets["auth"]["session_secret"]
+        if secret:
+            return secret.encode()
+    except Exception:
+        pass
+    if os.getenv("SESSION_SECRET"):
+        return os.getenv("SESSION_SECRET").encode()
+    return secrets.token_bytes(32)  # Per-process fallback
+
+SESSION_SECRET = _load_session_secret()
+
+# Results of recent password checks, keyed by an HMAC of (stored hash, password), so
+# repeated attempts with the same credentials don't re-run the key derivation
+_verify_cache = OrderedDict()
+_verify_lock = threading.Lock()
+
+
+def verify_password(password_hash, password):
+    """check_password_hash with a bounded in-memory cache of recent results."""
+    key = hmac.new(SESSION_SECRET, f"{password_hash}\0{password}".encode(), hashlib.sha256).digest()
+    with _verify_lock:
+        if key in _verify_cache:
+            _verify_cache.move_to_end(key)
+            return _verify_cache[key]
+    result = check_password_hash(password_hash, password)
+    with _verify_lock:
+        _verify_cache[key] = result
+        if len(_verify_cache) > VERIFY_CACHE_SIZE:
+            _verify_cache.popitem(last=False)
+    return result
+
+
+# Identity used by the mock login (no Google client configured)
+MOCK_USER = {
+    "name": "Demo User",
+    "email": "demo@example.com",
+    "picture": "https://www.gravatar.com/avatar/00000000000000000000000000000000?d=mp&f=y"
+}
+
+
+# --- Login Sessions ---
+def _token_hash(token):
+    # Only hashes are stored, so a copy of the database holds no usable tokens
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+def create_session(user_data):
+    """Stores a new login session and returns its opaque token (no user data is encoded in it)."""
+    token = secrets.token_urlsafe(32)
+    db_manager.create_session(_token_hash(token), user_data.get('email'), json.dumps(user_data),
+                              time.time() + SESSION_TOKEN_TTL)
+    return token
+
+
+def load_session(token):
+    """The user profile of a live session, or None if the token is unknown, expired or revoked."""
+    if not token:
+        return None
+    user_data = db_manager.get_session(_token_hash(token))
+    return json.loads(user_data) if user_data else None
+
+
+def restore_login(token):
+    """What a page reload does: (user profile, today's check count) for a live session token, or None."""
+    user_data = load_session(token)
+    if user_data is None:
+        return None
+    return user_data, db_manager.get_daily_checks(user_data.get('email'))
+
+
+def revoke_session(token):
+    if token:
+        db_manager.delete_session(_token_hash(token))
+
+
+# --- Browser Cookies ---
+# Streamlit can't set response cookies, so the browser sets them from a one-off script.
+# Values are token_urlsafe()-style strings, safe to embed as-is.
+def _cookie_script(name, value, max_age, same_site="Strict"):
+    return (f"<script>document.cookie = '{name}={value}; Max-Age={max_age}; Path=/; SameSite={same_site}'"
+            f" + (location.protocol === 'https:' ? '; Secure' : '');</script>")
+
+
+def _queue_cookie(name, value, max_age, same_site="Strict"):
+    """Sets (or with max_age=0 clears) a cookie on the next GoogleAuth.sync_cookies()."""
+    st.session_state.setdefault('pending_cookies', {})[name] = (value, max_age, same_site)
+
+
+def _client_ip():
+    """
+    The client's IP, or None when it isn't known (e.g. on localhost). Behind a trusted proxy
+    it is the nearest X-Forwarded-For hop that isn't one of TRUSTED_PROXIES.
+    """
+    try:
+        ip = st.context.ip_address
+        forwarded = st.context.headers.get("X-Forwarded-For") or ""
+    except Exception:
+        return None
+    if ip in TRUSTED_PROXIES:
+        hops = [hop.strip() for hop in forwarded.split(",") if hop.strip()]
+        return next((hop for hop in reversed(hops) if hop not in TRUSTED_PROXIES), None)
+    return ip or None
+
 class GoogleAuth:
     def __init__(self):
         # Allow insecure localhost for testing
@@ -38,21 +169,19 @@ class GoogleAuth:
             st.error(f"Config Error: {e}")
 
     def get_login_url(self):
+        """Google login URL for this browser session (its state is also written to a cookie here)."""
         if not self.client_config:
             return f"{self.auth_redirect_uri}/?mock_login=true"
             
         try:
-            flow = Flow.from_client_config(
-                self.client_config,
-                scopes=[
-                    'openid', 
-                    'https://www.googleapis.com/auth/userinfo.email', 
-                    'https://www.googleapis.com/auth/userinfo.profile'
-                ],
-                redirect_uri=self.auth_redirect_uri
-            )
-            auth_url, _ = flow.authorization_url(prompt='consent', access_type='offline')
-            return auth_url
+            # One state + PKCE verifier per browser session, reused across reruns for half its lifetime
+            login = st.session_state.get('oauth_login')
+            if login is None or time.time() - login[2] > LOGIN_STATE_TTL / 2:
+                url, state = get_oauth_client(self.client_config, self.auth_redirect_uri).begin_login()
+                login = st.session_state.oauth_login = (url, state, time.time())
+            # Lax, not Strict: the cookie has to survive the redirect back from Google
+            st.html(_cookie_script(OAUTH_STATE_COOKIE, login[1], LOGIN_STATE_TTL, "Lax"), unsafe_allow_javascript=True)
+            return login[0]
         except Exception as e:
             st.error(f"Error generating login URL: {e}")
             return "#"
@@ -61,11 +190,7 @@ class GoogleAuth:
         # 1. Check Mock Login
         if st.query_params.get("mock_login") == "true":
             st.query_params.clear()
-            return {
-                "name": "Demo User",
-                "email": "demo@example.com",
-                "picture": "https://www.gravatar.com/avatar/00000000000000000000000000000000?d=mp&f=y"
-            }
+            return dict(MOCK_USER)
 
         if not self.client_config:
             return None
@@ -74,31 +199,17 @@ class GoogleAuth:
         code = st.query_params.get("code")
         if code:
             try:
-                flow = Flow.from_client_config(
-                    self.client_config,
-                    scopes=[
-                        'openid', 
-                        'https://www.googleapis.com/auth/userinfo.email', 
-                        'https://www.googleapis.com/auth/userinfo.profile'
-                    ],
-                    redirect_uri=self.auth_redirect_uri
-                )
-                flow.fetch_token(code=code)
-                credentials = flow.credentials
-                
-                # Fetch User Info
-                import requests
-                
-                response = requests.get(
-                    'https://www.googleapis.com/oauth2/v3/userinfo',
-                    headers={'Authorization': f'Bearer {credentials.token}'}
-                )
+                # CSRF check: the callback's state must be the one this browser started the login with
+                state = st.query_params.get("state")
+                expected = st.context.cookies.get(OAUTH_STATE_COOKIE)
+                if not state or not isinstance(expected, str) or not hmac.compare_digest(state, expected):
+                    raise ValueError("This login didn't start in this browser. Please log in again.")
+                _queue_cookie(OAUTH_STATE_COOKIE, "", 0, "Lax")
+                oauth = get_oauth_client(self.client_config, self.auth_redirect_uri)
+                credentials = oauth.exchange_code(code, state)
                 
-                if response.status_code != 200:
-                    st.error(f"Failed to fetch user info: {response.text}")
-                    return None
-                    
-                user_info = response.json()
+                # Fetch User Info (validated locally from the ID token when possible)
+                user_info = oauth.user_info(credentials)
                 
                 # Sync with DB and Load Persistence
                 db_user = db_manager.sync_user_data(
@@ -119,10 +230,46 @@ class GoogleAuth:
         return None
 
     def sign_out(self):
+        # Revoke server-side first: a copied cookie stops working immediately
+        revoke_session(st.session_state.get('session_token'))
         for key in list(st.session_state.keys()):
             del st.session_state[key]
+        _queue_cookie(SESSION_COOKIE, "", 0)
+        st.query_params.clear()
         st.rerun()
 
+    # --- Login Sessions ---
+
+    def start_session(self, user_data):
+        """Creates a server-side session; its token goes to a cookie (never the URL) on the next run."""
+        token = create_session(user_data)
+        st.session_state.user = user_data
+        st.session_state.session_token = token
+        _queue_cookie(SESSION_COOKIE, token, SESSION_TOKEN_TTL)
+
+    def restore_session(self):
+        """
+        Restores the user from the session cookie (e.g. after a page reload).
+        Skips password verification and sync_user_data; only today's usage count is read.
+        """
+        token = st.context.cookies.get(SESSION_COOKIE)
+        if not isinstance(token, str) or not token:
+            return None
+        restored = restore_login(token)
+        if restored is None:
+            _queue_cookie(SESSION_COOKIE, "", 0)  # Expired or revoked: drop the stale cookie
+            return None
+        user_data, st.session_state.daily_checks = restored
+        st.session_state.session_token = token
+        return user_data
+
+    def sync_cookies(self):
+        """Writes (or clears) the cookies queued by the previous run (login, sign-out, OAuth callback)."""
+        pending = st.session_state.pop('pending_cookies', None)
+        if pending:
+            st.html("".join(_cookie_script(name, *cookie) for name, cookie in pending.items()),
+                    unsafe_allow_javascript=True)
+
     # --- Email/Password Auth Methods ---
     
     def register_user(self, email, password):
@@ -130,7 +277,7 @@ class GoogleAuth:
         if db_manager.get_user_by_email(email):
             return False, "Email already exists."
         
-        hashed_pw = generate_password_hash(password)
+        hashed_pw = generate_password_hash(password, method=PASSWORD_HASH_METHOD)
         success = db_manager.create_user(email, hashed_pw)
         if success:
             return True, "Account created successfully! Please login."
@@ -138,8 +285,29 @@ class GoogleAuth:
 
     def login_user(self, email, password):
         """Verifies credentials and sets user session."""
+        # Unknown IPs (localhost, an untrusted proxy) would all share one bucket, so they only get the email limit
+        limits = [(LOGIN_EMAIL_LIMITER, (email or "").strip().lower())]
+        client_ip = _client_ip()
+        if client_ip:
+            limits.append((LOGIN_IP_LIMITER, client_ip))
+
+        # Throttle before touching the DB or running the (deliberately slow) password hash. Each attempt
+        # takes its token up front, so a concurrent burst can't all pass the check before any of them pays.
+        taken = []
+        for limiter, key in limits:
+            retry_after = limiter.acquire(key)
+            if retry_after > 0:
+                for taken_limiter, taken_key in taken:
+                    taken_limiter.refund(taken_key)
+                return False, f"Too many login attempts. Please try again in {math.ceil(retry_after)} seconds."
+            taken.append((limiter, key))
+
         user = db_manager.get_user_by_email(email)
-        if user and check_password_hash(user['password_hash'], password):
+        if user and user['password_hash'] and verify_password(user['password_hash'], password):
+            # Only failed attempts cost tokens, so successful logins are never throttled
+            for limiter, key in limits:
+                limiter.refund(key)
+
             # Sync to reset daily checks if a new day
             db_user = db_manager.sync_user_data(email)
             st.session_state.daily_checks = db_user.get('daily_checks', 0)
@@ -152,4 +320,5 @@ class GoogleAuth:
                 "picture": db_user['picture']
             }
             return True, user_data
+
         return False, "Invalid email or password."
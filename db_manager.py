@@ -1,9 +1,16 @@
 import sqlite3
 import os
-from datetime import datetime
+import time
+from datetime import datetime, timedelta
 
 DB_PATH = "users.db"
 
+# --- Analysis History Settings ---
+HISTORY_RETENTION_DAYS = 365
+HISTORY_PAGE_SIZE = 20
+HISTORY_PRUNE_BATCH = 5000  # Rows deleted per transaction, so pruning never holds the write lock for long
+HISTORY_TIME_FORMAT = "%Y-%m-%d %H:%M:%S"  # Sorts chronologically as text
+
 def get_db_connection():
     conn = sqlite3.connect(DB_PATH)
     conn.row_factory = sqlite3.Row
@@ -26,6 +33,68 @@ def init_db():
         )
     ''')
     
+    # Login throttling state (token buckets per IP / email), see rate_limiter.py
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS rate_limits (
+            bucket TEXT PRIMARY KEY,
+            tokens REAL NOT NULL,
+            updated_at REAL NOT NULL
+        )
+    ''')
+    
+    # Login sessions, keyed by a hash of the opaque token kept in the browser's cookie
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS sessions (
+            token_hash TEXT PRIMARY KEY,
+            email TEXT,
+            user_data TEXT NOT NULL,
+            expires_at REAL NOT NULL
+        )
+    ''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_sessions_expires ON sessions (expires_at)")
+    
+    # Google logins in progress: PKCE verifier per OAuth state, until the callback uses it
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS oauth_states (
+            state TEXT PRIMARY KEY,
+            code_verifier TEXT NOT NULL,
+            expires_at REAL NOT NULL
+        )
+    ''')
+    
+    # Analysis history: one row per analyzed image (raw metrics + scores)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS analysis_history (
+            id INTEGER PRIMARY KEY,
+            user_email TEXT NOT NULL,
+            content_hash TEXT NOT NULL,
+            created_at TEXT NOT NULL,
+            filename TEXT,
+            overall_score INTEGER NOT NULL,
+            resolution_score INTEGER,
+            blur_score INTEGER,
+            brightness_score INTEGER,
+            width INTEGER,
+            height INTEGER,
+            blur_value REAL,
+            brightness_value REAL,
+            blur_status TEXT,
+            brightness_status TEXT
+        )
+    ''')
+    # Every history query is scoped to one user, so each index leads with user_email.
+    # Pages and trends walk (user, time) newest first; the score rides along in the same
+    # index, so score filters are checked per index entry with no table lookup and no sort.
+    # Retention pruning walks created_at alone.
+    cursor.execute("DROP INDEX IF EXISTS idx_history_user_time")  # Superseded by idx_history_user_time_score
+    cursor.execute("DROP INDEX IF EXISTS idx_history_user_score")  # Made the planner sort every row of the user
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_history_user_time_score ON analysis_history (user_email, created_at, id, overall_score)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_history_user_hash ON analysis_history (user_email, content_hash)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_history_created ON analysis_history (created_at)")
+
+    # WAL lets the dashboard read history while batch inserts are being written
+    cursor.execute("PRAGMA journal_mode=WAL")
+    
     # MIGRATION: Check if column exists, if not add it
     try:
         cursor.execute("SELECT daily_checks FROM users LIMIT 1")
@@ -89,12 +158,13 @@ def sync_user_data(email, name=None, picture=None):
     return user
 
 def update_user_checks(email, count):
-    """Update the number of checks performed by a user."""
+    """Update the number of checks performed by a user (for today)."""
+    today = datetime.now().strftime("%Y-%m-%d")
     conn = get_db_connection()
     cursor = conn.cursor()
     cursor.execute(
-        "UPDATE users SET daily_checks = ? WHERE email = ?",
-        (count, email)
+        "UPDATE users SET daily_checks = ?, last_check_date = ? WHERE email = ?",
+        (count, today, email)
     )
     conn.commit()
     conn.close()
@@ -124,5 +194,212 @@ def get_user_by_email(email):
     conn.close()
     return user
 
+def get_daily_checks(email):
+    """Today's check count for a user (0 if none yet today), without the writes done by sync_user_data."""
+    today = datetime.now().strftime("%Y-%m-%d")
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute("SELECT daily_checks, last_check_date FROM users WHERE email = ?", (email,))
+    row = cursor.fetchone()
+    conn.close()
+    if not row or row['last_check_date'] != today:
+        return 0
+    return row['daily_checks'] or 0
+
+def load_rate_limits(prefix, stale_before):
+    """
+    Returns [(bucket, tokens, updated_at)] for the buckets starting with `prefix`.
+    Rows last updated before `stale_before` (refilled by now) are deleted instead.
+    """
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    # Prefix match as a primary key range: bucket >= prefix AND bucket < prefix with its last char bumped
+    upper = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+    cursor.execute("DELETE FROM rate_limits WHERE bucket >= ? AND bucket < ? AND updated_at < ?", (prefix, upper, stale_before))
+    cursor.execute("SELECT bucket, tokens, updated_at FROM rate_limits WHERE bucket >= ? AND bucket < ?", (prefix, upper))
+    rows = [(row['bucket'], row['tokens'], row['updated_at']) for row in cursor.fetchall()]
+    conn.commit()
+    conn.close()
+    return rows
+
+def save_rate_limit(bucket, tokens, updated_at):
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute(
+        "INSERT OR REPLACE INTO rate_limits (bucket, tokens, updated_at) VALUES (?, ?, ?)",
+        (bucket, tokens, updated_at)
+    )
+    conn.commit()
+    conn.close()
+
+# --- Login Sessions ---
+def create_session(token_hash, email, user_data, expires_at):
+    """Stores a login session (`user_data` is the JSON profile); expired sessions are cleared out on the way."""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute("DELETE FROM sessions WHERE expires_at < ?", (time.time(),))
+    cursor.execute(
+        "INSERT OR REPLACE INTO sessions (token_hash, email, user_data, expires_at) VALUES (?, ?, ?, ?)",
+        (token_hash, email, user_data, expires_at)
+    )
+    conn.commit()
+    conn.close()
+
+def get_session(token_hash):
+    """Returns the JSON profile of an unexpired session, or None."""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute("SELECT user_data FROM sessions WHERE token_hash = ? AND expires_at >= ?", (token_hash, time.time()))
+    row = cursor.fetchone()
+    conn.close()
+    return row['user_data'] if row else None
+
+def delete_session(token_hash):
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute("DELETE FROM sessions WHERE token_hash = ?", (token_hash,))
+    conn.commit()
+    conn.close()
+
+# --- OAuth Login State ---
+def save_oauth_state(state, code_verifier, expires_at):
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute("DELETE FROM oauth_states WHERE expires_at < ?", (time.time(),))
+    cursor.execute(
+        "INSERT OR REPLACE INTO oauth_states (state, code_verifier, expires_at) VALUES (?, ?, ?)",
+        (state, code_verifier, expires_at)
+    )
+    conn.commit()
+    conn.close()
+
+def pop_oauth_state(state):
+    """Returns and deletes the verifier for an unexpired state (each state works once), or None."""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute("DELETE FROM oauth_states WHERE state = ? RETURNING code_verifier, expires_at", (state,))
+    row = cursor.fetchone()
+    conn.commit()
+    conn.close()
+    if not row or row['expires_at'] < time.time():
+        return None
+    return row['code_verifier']
+
+# --- Analysis History ---
+def add_analysis_history(email, records):
+    """
+    Bulk-inserts analysis results for a user in one transaction.
+    `records` is a list of (content_hash, filename, results) with results as returned by analyzer.analyze().
+    """
+    if not records:
+        return 0
+    now = datetime.now().strftime(HISTORY_TIME_FORMAT)
+    rows = [
+        (
+            email, content_hash, now, filename,
+            int(r['overall_score']),
+            int(r['resolution']['score']), int(r['blur']['score']), int(r['brightness']['score']),
+            int(r['resolution']['width']), int(r['resolution']['height']),
+            float(r['blur']['value']), float(r['brightness']['value']),
+            r['blur']['status'], r['brightness']['status']
+        )
+        for content_hash, filename, r in records
+    ]
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.executemany(
+        """INSERT INTO analysis_history (
+            user_email, content_hash, created_at, filename, overall_score,
+            resolution_score, blur_score, brightness_score, width, height,
+            blur_value, brightness_value, blur_status, brightness_status
+        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+        rows
+    )
+    conn.commit()
+    conn.close()
+    return len(rows)
+
+def record_analyses(email, records, daily_checks=None):
+    """
+    Saves newly finished analyses (see image_cache.collect_batch): one bulk history insert and,
+    for metered (Free) users, today's usage starting from `daily_checks`.
+    Returns the new usage count, or None for unmetered users.
+    """
+    add_analysis_history(email, records)
+    if daily_checks is None:
+        return None
+    if records:
+        daily_checks += len(records)
+        update_user_checks(email, daily_checks)
+    return daily_checks
+
+def get_analysis_history(email, limit=HISTORY_PAGE_SIZE, before=None, min_score=None, max_score=None):
+    """
+    One page of a user's history, newest first.
+    Keyset pagination: `before` is the cursor returned with the previous page, so deep pages
+    cost the same as the first one (no OFFSET scans). Returns (rows, next_cursor); next_cursor is None on the last page.
+    """
+    query = "SELECT * FROM analysis_history WHERE user_email = ?"
+    params = [email]
+    if min_score is not None:
+        query += " AND overall_score >= ?"
+        params.append(min_score)
+    if max_score is not None:
+        query += " AND overall_score <= ?"
+        params.append(max_score)
+    if before is not None:
+        query += " AND (created_at, id) < (?, ?)"
+        params.extend(before)
+    query += " ORDER BY created_at DESC, id DESC LIMIT ?"
+    params.append(limit + 1)  # One extra row tells us whether there is a next page
+
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute(query, params)
+    rows = [dict(row) for row in cursor.fetchall()]
+    conn.close()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = (rows[-1]['created_at'], rows[-1]['id'])
+    return rows, next_cursor
+
+def get_score_trend(email, days=30):
+    """Per-day check count and average scores for a user over the last `days` days (an index range scan)."""
+    since = (datetime.now() - timedelta(days=days)).strftime(HISTORY_TIME_FORMAT)
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute(
+        """SELECT substr(created_at, 1, 10) AS day, COUNT(*) AS checks,
+                  AVG(overall_score) AS overall_score, AVG(blur_score) AS blur_score,
+                  AVG(brightness_score) AS brightness_score
+           FROM analysis_history
+           WHERE user_email = ? AND created_at >= ?
+           GROUP BY day ORDER BY day""",
+        (email, since)
+    )
+    rows = [dict(row) for row in cursor.fetchall()]
+    conn.close()
+    return rows
+
+def prune_analysis_history(retention_days=HISTORY_RETENTION_DAYS):
+    """Deletes history older than the retention window in small batches. Returns the number of rows removed."""
+    cutoff = (datetime.now() - timedelta(days=retention_days)).strftime(HISTORY_TIME_FORMAT)
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    removed = 0
+    while True:
+        cursor.execute(
+            "DELETE FROM analysis_history WHERE id IN (SELECT id FROM analysis_history WHERE created_at < ? LIMIT ?)",
+            (cutoff, HISTORY_PRUNE_BATCH)
+        )
+        conn.commit()
+        removed += cursor.rowcount
+        if cursor.rowcount < HISTORY_PRUNE_BATCH:
+            break
+    conn.close()
+    return removed
+
 # Initialize the DB on import
 init_db()
@@ -0,0 +1,239 @@
+import functools
+import os
+import threading
+import cv2
+import numpy as np
+from analysis import brightness_histogram
+from superres import FSRCNNUpscaler, MODEL_PATH, SCALE
+
+# --- Enhancement Settings ---
+UPSCALE_FACTOR = SCALE  # FSRCNN_x3
+# Brightness is pulled into this band of mean V (HSV) values, inside the
+# analyzer's acceptable 80-200 range
+TARGET_BRIGHTNESS_MIN = 110.0
+TARGET_BRIGHTNESS_MAX = 170.0
+GAMMA_RANGE = (0.3, 3.0)
+CONTRAST_CLIP_PERCENT = 0.5  # % of pixels clipped at each end by auto-contrast
+CONTRAST_MAX_GAIN = 1.6
+SHARPEN_SIGMA = 2.0
+SHARPEN_AMOUNT = 0.6
+# 'upscale_fast' runs FSRCNN only on detailed regions (superres fast mode)
+OPERATIONS = ('brightness', 'contrast', 'sharpen', 'upscale', 'upscale_fast')
+# Brightness goes last among the tone steps so the final mean lands in the target band
+PROCESS_ALL_OPERATIONS = ('contrast', 'brightness', 'sharpen')
+PREVIEW_MAX_SIDE = 1280  # Long side of the screen-sized proxy used for interactive previews
+
+LEVELS = np.arange(256, dtype=np.float64)
+IDENTITY_LUT = np.arange(256, dtype=np.uint8)
+
+
+# --- Tone Curves (256-entry lookup tables) ---
+def remap_histogram(histogram, lut):
+    """Histogram of the image after applying `lut`, computed without touching pixels."""
+    return np.bincount(lut, weights=histogram, minlength=256)
+
+
+def histogram_mean(histogram):
+    return float(np.dot(histogram, LEVELS) / max(histogram.sum(), 1))
+
+
+def gamma_lut(gamma):
+    return np.clip(np.rint(255.0 * (LEVELS / 255.0) ** gamma), 0, 255).astype(np.uint8)
+
+
+def brightness_lut(histogram):
+    """
+    Gamma curve that moves the mean brightness into the target band.
+    Gamma is monotonic, so applying it to B, G and R moves V (their max) by exactly the same curve,
+    which lets us solve for gamma on the histogram alone.
+    """
+    mean = histogram_mean(histogram)
+    target = min(max(mean, TARGET_BRIGHTNESS_MIN), TARGET_BRIGHTNESS_MAX)
+    if abs(target - mean) < 1.0:
+        return IDENTITY_LUT
+
+    # Output mean decreases monotonically with gamma: bisect in log space
+    lo, hi = np.log(GAMMA_RANGE[0]), np.log(GAMMA_RANGE[1])
+    total = max(histogram.sum(), 1)
+    for _ in range(30):
+        mid = (lo + hi) / 2
+        out_mean = np.dot(histogram, 255.0 * (LEVELS / 255.0) ** np.exp(mid)) / total
+        if out_mean > target:
+            lo = mid
+        else:
+            hi = mid
+    return gamma_lut(np.exp((lo + hi) / 2))
+
+
+def contrast_lut(histogram):
+    """Percentile auto-contrast stretch from the black point, with the gain capped to avoid posterizing flat images."""
+    cdf = np.cumsum(histogram)
+    total = cdf[-1]
+    if total == 0:
+        return IDENTITY_LUT
+    low = int(np.searchsorted(cdf, total * CONTRAST_CLIP_PERCENT / 100.0))
+    high = int(np.searchsorted(cdf, total * (1 - CONTRAST_CLIP_PERCENT / 100.0)))
+    if high <= low:
+        return IDENTITY_LUT
+    gain = min(255.0 / (high - low), CONTRAST_MAX_GAIN)
+    return np.clip(np.rint((LEVELS - low) * gain), 0, 255).astype(np.uint8)
+
+
+# --- Preview Proxy ---
+def make_proxy(image_cv, max_side=PREVIEW_MAX_SIDE):
+    """Screen-sized copy of the image for previews (the original is returned if already small)."""
+    h, w = image_cv.shape[:2]
+    scale = max_side / float(max(h, w))
+    if scale >= 1.0:
+        return image_cv
+    size = (max(1, int(round(w * scale))), max(1, int(round(h * scale))))
+    return cv2.resize(image_cv, size, interpolation=cv2.INTER_AREA)
+
+
+def bicubic_upscale(image_cv, factor=UPSCALE_FACTOR):
+    h, w = image_cv.shape[:2]
+    return cv2.resize(image_cv, (w * factor, h * factor), interpolation=cv2.INTER_CUBIC)
+
+
+# --- Spatial Operations ---
+def unsharp_mask(image_cv, sigma=SHARPEN_SIGMA, amount=SHARPEN_AMOUNT):
+    """Sharpens with one blur and one weighted add; the blur buffer doubles as the output."""
+    out = cv2.GaussianBlur(image_cv, (0, 0), sigma)
+    # out = image * (1 + amount) - blurred * amount
+    cv2.addWeighted(image_cv, 1.0 + amount, out, -amount, 0, dst=out)
+    return out
+
+
+class EnhancementChain:
+    """
+    An ordered list of enhancement steps applied to whole images.
+
+    Tone steps build a 256-entry LUT from the current histogram. Consecutive tone
+    steps are fused into a single LUT (the histogram is pushed through each curve
+    analytically), so any run of them costs one cv2.LUT pass. Spatial steps
+    (sharpening, upscaling) return new arrays, which later tone passes then
+    update in place.
+    """
+    def __init__(self):
+        self.steps = []
+
+    def tone(self, name, make_lut):
+        self.steps.append(('tone', name, make_lut))
+        return self
+
+    def spatial(self, name, fn):
+        self.steps.append(('spatial', name, fn))
+        return self
+
+    @property
+    def names(self):
+        return [name for _, name, _ in self.steps]
+
+    def run(self, image_cv, histogram=None):
+        """Applies the chain; `image_cv` is never modified. `histogram` (V channel) skips one histogram pass."""
+        image, owned = image_cv, False
+        pending = IDENTITY_LUT
+        hist = histogram
+
+        for kind, _, fn in self.steps:
+            if kind == 'tone':
+                if hist is None:
+                    # Histogram of the current pixels, pushed through the LUT not yet applied
+                    hist = remap_histogram(brightness_histogram(image), pending)
+                lut = fn(hist)
+                pending = lut[pending]
+                hist = remap_histogram(hist, lut)
+            else:
+                image, owned = self._apply_lut(image, pending, owned)
+                pending = IDENTITY_LUT
+                image, owned = fn(image), True
+                hist = None
+
+        image, owned = self._apply_lut(image, pending, owned)
+        return image if owned else image.copy()
+
+    @staticmethod
+    def _apply_lut(image, lut, owned):
+        if lut is IDENTITY_LUT or np.array_equal(lut, IDENTITY_LUT):
+            return image, owned
+        if owned:
+            cv2.LUT(image, lut, dst=image)
+            return image, True
+        return cv2.LUT(image, lut), True
+
+
+class ImageEnhancer:
+    def __init__(self, model_path=MODEL_PATH):
+        self.model_path = model_path
+        self._sr = None
+        self._sr_lock = threading.Lock()
+
+    # --- Chain Building ---
+    def chain(self, operations, preview=False):
+        """
+        Builds an EnhancementChain from operation names (see OPERATIONS).
+        With preview=True, upscaling is skipped: previews run on the screen-sized proxy,
+        and a 3x copy of it would only be scaled back down by the browser.
+        """
+        chain = EnhancementChain()
+        for op in operations:
+            if op == 'brightness':
+                chain.tone(op, brightness_lut)
+            elif op == 'contrast':
+                chain.tone(op, contrast_lut)
+            elif op == 'sharpen':
+                chain.spatial(op, unsharp_mask)
+            elif op in ('upscale', 'upscale_fast'):
+                if preview:
+                    continue
+                mode = 'fast' if op == 'upscale_fast' else 'full'
+                chain.spatial(op, functools.partial(self._upscale, mode=mode))
+            else:
+                raise ValueError(f"Unknown enhancement operation: {op}")
+        return chain
+
+    def render(self, image_cv, operations, histogram=None, preview=False):
+        """
+        Applies a recorded operation chain.
+        Previews should be rendered on make_proxy(image_cv); passing the full-resolution
+        histogram keeps the preview tone curves identical to the final render.
+        """
+        return self.chain(operations, preview=preview).run(image_cv, histogram)
+
+    # --- Operations ---
+    def fix_brightness(self, image_cv, histogram=None):
+        return self.chain(['brightness']).run(image_cv, histogram)
+
+    def sharpen(self, image_cv):
+        return unsharp_mask(image_cv)
+
+    def enhance_resolution(self, image_cv, mode='full'):
+        """3x super resolution with FSRCNN (bicubic if the model is unavailable). mode is 'full' or 'fast'."""
+        return self._upscale(image_cv, mode)
+
+    def process_all(self, image_cv, histogram=None):
+        """Contrast + brightness (fused into one LUT pass), then sharpening."""
+        return self.chain(PROCESS_ALL_OPERATIONS).run(image_cv, histogram)
+
+    def upscale_many(self, images, mode='full'):
+        """3x upscales of many images (yielded in order), batched through FSRCNN; bicubic if the model is unavailable."""
+        sr = self._load_sr()
+        if sr is None:
+            return (bicubic_upscale(image_cv) for image_cv in images)
+        return sr.upscale_many(images, mode)
+
+    # --- Super Resolution ---
+    def _load_sr(self):
+        with self._sr_lock:
+            if self._sr is None:
+                if not os.path.exists(self.model_path):
+                    return None
+                self._sr = FSRCNNUpscaler(self.model_path)
+            return self._sr
+
+    def _upscale(self, image_cv, mode='full'):
+        sr = self._load_sr()
+        if sr is None:
+            return bicubic_upscale(image_cv)
+        return sr.upscale(image_cv, mode)
+
@@ -0,0 +1,256 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from artifact_store import ArtifactHandle, get_store
+from enhancement import make_proxy
+
+# --- Session Image Cache ---
+# Holds decoded images, analysis results and enhanced outputs for one session
+# so Streamlit reruns (e.g. clicking "Fix Brightness" after "Smart Upscale")
+# don't decode and analyze the same upload again. Pixel data lives in the
+# process-wide ArtifactStore (spilled to memory-mapped files when large); the
+# cache itself only holds handles.
+MAX_ENTRIES = 8
+MAX_BYTES = 512 * 1024 * 1024  # 512 MB of pixel data per session
+ANALYSIS_POLL_INTERVAL = 0.5  # seconds between progress refreshes while analysis runs in the background
+
+
+def content_key(uploaded_file):
+    """Cache key for an upload: Streamlit file id + SHA-1 of the bytes."""
+    # UploadedFile is a BytesIO, so getbuffer() hashes without copying
+    with uploaded_file.getbuffer() as buf:
+        digest = hashlib.sha1(buf).hexdigest()
+    file_id = getattr(uploaded_file, 'file_id', None) or uploaded_file.name
+    return f"{file_id}:{digest}"
+
+
+def key_digest(cache_key):
+    """The content hash part of a content_key() (same bytes -> same digest across sessions)."""
+    return cache_key.rsplit(':', 1)[-1]
+
+
+def analyze_bytes(analyzer, data, store=None):
+    """
+    Decode + analyze; safe to run on a worker thread (touches no session state).
+    With a store, the decoded image is handed back as an artifact handle, so it is
+    spilled on the worker rather than on the script thread.
+    """
+    image_cv = analyzer.load_image(data)
+    results = analyzer.analyze(image_cv)
+    return (store.put_array(image_cv) if store is not None else image_cv), results
+
+
+def collect_batch(cache, keys, filenames):
+    """
+    Moves finished analyses of one upload batch into the cache (one poll of the progress view).
+    Returns (entries, finished): entries[i] is None while image i is still running, and finished
+    lists (content_hash, filename, results) for the images that completed on this call, ready
+    for db_manager.record_analyses. Analysis errors are re-raised.
+    """
+    entries, finished = [], []
+    for key, filename in zip(keys, filenames):
+        was_pending = cache.is_pending(key)
+        entry = cache.collect(key)
+        if entry is not None and was_pending:
+            finished.append((key_digest(key), filename, entry.results))
+        entries.append(entry)
+    return entries, finished
+
+
+class CacheEntry:
+    def __init__(self, image, results, store):
+        self.image = image  # ArtifactHandle of the decoded image
+        self.results = results
+        self._store = store
+        self._proxy = None  # ArtifactHandle, or None until a preview is needed
+        self.enhanced = {}  # (operation, preview) -> ArtifactHandle of the enhanced image
+
+    @property
+    def image_cv(self):
+        return self.image.get()
+
+    @property
+    def alive(self):
+        """False once the store has evicted the decoded image (TTL / disk budget)."""
+        return self.image.alive
+
+    @property
+    def proxy(self):
+        """Screen-sized version of image_cv used for previews."""
+        if self._proxy is None or not self._proxy.alive:
+            image_cv = self.image_cv
+            proxy = make_proxy(image_cv)
+            self._proxy = self.image.share() if proxy is image_cv else self._store.put_array(proxy)
+        return self._proxy.get()
+
+    @property
+    def nbytes(self):
+        handles = [self.image] + list(self.enhanced.values())
+        if self._proxy is not None and self._proxy.key != self.image.key:
+            handles.append(self._proxy)
+        return sum(h.nbytes for h in handles)
+
+    def drop_enhanced(self, slot):
+        self.enhanced.pop(slot).release()
+
+    def release(self):
+        for handle in [self.image, self._proxy] + list(self.enhanced.values()):
+            if handle is not None:
+                handle.release()
+        self.enhanced.clear()
+
+
+class ImageCache:
+    """
+    Per-session LRU cache of CacheEntry objects.
+    Evicts the least recently used entries once either the entry count or the
+    total pixel data (wherever the store keeps it) goes over its limit.
+    Thread-safe: deferred downloads run on Streamlit's worker threads while the
+    click's rerun uses the same cache. Enhancements are computed outside the lock.
+    """
+    def __init__(self, max_entries=MAX_ENTRIES, max_bytes=MAX_BYTES, store=None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.store = store or get_store()
+        self._entries = OrderedDict()
+        self._pending = {}  # key -> Future of (image handle, results) from the scheduler
+        self._failed = OrderedDict()  # key -> exception from a failed analysis (kept until the upload changes)
+        self._lock = threading.RLock()
+
+    def __contains__(self, key):
+        with self._lock:
+            return self._live(key) is not None
+
+    def _live(self, key):
+        """The entry for key, dropping it first if the store has evicted its image."""
+        entry = self._entries.get(key)
+        if entry is not None and not entry.alive:
+            del self._entries[key]
+            entry.release()
+            return None
+        return entry
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+    @property
+    def nbytes(self):
+        with self._lock:
+            return sum(entry.nbytes for entry in self._entries.values())
+
+    def get(self, key):
+        with self._lock:
+            entry = self._live(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key, image, results):
+        """Adds an entry; `image` is an ArtifactHandle or an array (stored here)."""
+        if not isinstance(image, ArtifactHandle):
+            image = self.store.put_array(image)
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                old.release()
+            entry = CacheEntry(image, results, self.store)
+            self._entries[key] = entry
+            self._evict(keep=key)
+            return entry
+
+    def request_analysis(self, uploaded_file, analyzer, submit):
+        """
+        Starts analysis in the background via submit(fn, *args) (e.g. TaskScheduler.submit)
+        unless the upload is already cached, queued or known to fail. Returns its cache key.
+        """
+        key = content_key(uploaded_file)
+        with self._lock:
+            if key not in self and key not in self._pending and key not in self._failed:
+                # getvalue() shares the upload's bytes rather than copying them
+                self._pending[key] = submit(analyze_bytes, analyzer, uploaded_file.getvalue(), self.store)
+        return key
+
+    def is_pending(self, key):
+        with self._lock:
+            return key in self._pending and key not in self
+
+    def collect(self, key):
+        """
+        Returns the entry for `key` once its analysis has finished, or None while it is still running.
+        Errors raised by the analysis are re-raised here, on this and every later call for the same
+        upload, so an undecodable file isn't queued again on each rerun.
+        """
+        with self._lock:
+            if key in self._failed:
+                raise self._failed[key]
+            entry = self.get(key)
+            if entry is not None:
+                return entry
+            future = self._pending.get(key)
+            if future is None or not future.done():
+                return None
+            del self._pending[key]
+            error = future.exception()
+            if error is not None:
+                self._failed[key] = error
+                if len(self._failed) > self.max_entries:
+                    self._failed.popitem(last=False)
+                raise error
+        image, results = future.result()
+        return self.put(key, image, results)
+
+    def get_enhanced(self, key, operation, fn, preview=False):
+        """
+        Returns the cached output of `operation` for entry `key`, computing it with fn(image) if needed.
+        With preview=True, fn runs on the entry's screen-sized proxy instead of the full image.
+        """
+        slot = (operation, preview)
+        with self._lock:
+            entry = self.get(key)
+            if entry is None:
+                raise KeyError(key)
+            handle = entry.enhanced.get(slot)
+            if handle is not None and handle.alive:
+                return handle.get()
+            source = entry.proxy if preview else entry.image_cv
+        enhanced = fn(source)
+        stored = self.store.put_array(enhanced)
+        with self._lock:
+            if self._entries.get(key) is not entry:
+                # Evicted or replaced while fn ran: nothing to attach the result to
+                stored.release()
+                return enhanced
+            if slot in entry.enhanced:
+                entry.drop_enhanced(slot)
+            entry.enhanced[slot] = stored
+            self._evict(keep=key)
+        # The fresh result is returned as-is; later calls read it back from the store
+        return enhanced
+
+    def _evict(self, keep=None):
+        # Drop least recently used entries first; never drop the one in use
+        while len(self._entries) > self.max_entries or self.nbytes > self.max_bytes:
+            oldest = next(iter(self._entries))
+            if oldest == keep:
+                if len(self._entries) == 1:
+                    # A single oversized entry: shed its enhanced outputs instead
+                    entry = self._entries[oldest]
+                    if len(entry.enhanced) > 1:
+                        entry.drop_enhanced(next(iter(entry.enhanced)))
+                        continue
+                    break
+                self._entries.move_to_end(oldest)
+                continue
+            self._entries.pop(oldest).release()
+
+    def clear(self):
+        """Cancels queued analyses and releases every entry (e.g. on sign-out)."""
+        with self._lock:
+            for future in self._pending.values():
+                future.cancel()
+            self._pending.clear()
+            self._failed.clear()
+            for entry in self._entries.values():
+                entry.release()
+            self._entries.clear()
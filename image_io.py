@@ -0,0 +1,152 @@
+import io
+import cv2
+import numpy as np
+from PIL import Image, ImageOps
+
+# --- Image Decode / Encode ---
+# Uploaded bytes are decoded straight into a single BGR uint8 array for OpenCV,
+# without the PIL -> np.array -> cvtColor round trip (three full-size copies).
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+EXIF_ORIENTATION_TAG = 0x0112
+ALPHA_BACKGROUND = 255  # Transparent areas are composited onto white, like marketplace listings
+
+
+def _as_buffer(source):
+    """Returns a memoryview over the upload's bytes without copying them."""
+    if hasattr(source, 'getbuffer'):  # BytesIO / Streamlit UploadedFile
+        return source.getbuffer()
+    if hasattr(source, 'read'):
+        source.seek(0)
+        return memoryview(source.read())
+    return memoryview(source)
+
+
+def decode_image(source):
+    """
+    Decodes an uploaded file (or raw bytes) into a BGR uint8 array.
+
+    Whichever decoder handles the file (OpenCV, or PIL as the fallback), the result is normalized the same way:
+    - EXIF orientation is applied: by OpenCV for JPEGs, from the eXIf chunk for PNGs, by PIL otherwise.
+    - Grayscale and palette images are expanded to 3 channels.
+    - 16-bit PNGs are scaled down to 8 bits.
+    - Alpha is composited onto a white background.
+    """
+    with _as_buffer(source) as buf:
+        data = np.frombuffer(buf, dtype=np.uint8)
+        orientation = 1
+        if buf[:8] == PNG_SIGNATURE:
+            # Keep alpha and bit depth so we can normalize them ourselves. IMREAD_UNCHANGED
+            # also skips EXIF orientation, so that is read from the eXIf chunk instead.
+            image = cv2.imdecode(data, cv2.IMREAD_UNCHANGED)
+            orientation = _png_orientation(buf)
+        else:
+            # IMREAD_COLOR applies EXIF orientation and always yields 8-bit BGR
+            image = cv2.imdecode(data, cv2.IMREAD_COLOR)
+        del data  # release the export so the memoryview can be closed
+
+    if image is None:
+        return _decode_with_pil(source)
+    return _apply_orientation(_normalize(image), orientation)
+
+
+def _normalize(image):
+    if image.dtype != np.uint8:
+        image = cv2.convertScaleAbs(image, alpha=255.0 / 65535.0)
+    if image.ndim == 2:
+        return cv2.cvtColor(image, cv2.COLOR_GRAY2BGR)
+    if image.shape[2] == 4:
+        return _composite_alpha(image)
+    return image
+
+
+def _png_orientation(buf):
+    """EXIF Orientation (1-8) from a PNG's eXIf chunk; 1 if there is none. Walks chunk headers only."""
+    pos = len(PNG_SIGNATURE)
+    while pos + 8 <= len(buf):
+        length = int.from_bytes(buf[pos:pos + 4], 'big')
+        chunk_type = bytes(buf[pos + 4:pos + 8])
+        if chunk_type == b'eXIf':
+            return _exif_orientation(bytes(buf[pos + 8:pos + 8 + length]))
+        if chunk_type == b'IEND':
+            break
+        pos += length + 12  # length, type, data, CRC
+    return 1
+
+
+def _exif_orientation(exif):
+    """The Orientation tag from IFD0 of a TIFF-structured EXIF block; 1 if missing or malformed."""
+    order = {b'II': 'little', b'MM': 'big'}.get(exif[:2])
+    if order is None:
+        return 1
+    ifd = int.from_bytes(exif[4:8], order)
+    for i in range(int.from_bytes(exif[ifd:ifd + 2], order)):
+        entry = exif[ifd + 2 + 12 * i:ifd + 14 + 12 * i]
+        if len(entry) < 12:
+            break
+        if int.from_bytes(entry[:2], order) == EXIF_ORIENTATION_TAG:
+            value = int.from_bytes(entry[8:10], order)  # SHORT, left-justified in the value field
+            return value if 1 <= value <= 8 else 1
+    return 1
+
+
+def _apply_orientation(image, orientation):
+    """Rotates/flips an image to display orientation, as ImageOps.exif_transpose does."""
+    if orientation == 2:
+        return cv2.flip(image, 1)
+    if orientation == 3:
+        return cv2.rotate(image, cv2.ROTATE_180)
+    if orientation == 4:
+        return cv2.flip(image, 0)
+    if orientation == 5:
+        return cv2.transpose(image)
+    if orientation == 6:
+        return cv2.rotate(image, cv2.ROTATE_90_CLOCKWISE)
+    if orientation == 7:
+        return cv2.rotate(cv2.transpose(image), cv2.ROTATE_180)
+    if orientation == 8:
+        return cv2.rotate(image, cv2.ROTATE_90_COUNTERCLOCKWISE)
+    return image
+
+
+def _composite_alpha(image_bgra):
+    """Blends BGRA onto a solid background: out = bgr * a + bg * (1 - a)."""
+    alpha = image_bgra[:, :, 3]
+    image_bgr = cv2.cvtColor(image_bgra, cv2.COLOR_BGRA2BGR)
+    if alpha.min() == 255:
+        return image_bgr
+
+    alpha3 = cv2.cvtColor(alpha, cv2.COLOR_GRAY2BGR)
+    cv2.multiply(image_bgr, alpha3, dst=image_bgr, scale=1.0 / 255.0)
+    # Background contribution, reusing the alpha buffer: bg * (255 - a) / 255
+    # (array ops only: OpenCV treats a bare scalar as (s, 0, 0, 0) on 3-channel images)
+    cv2.bitwise_not(alpha3, dst=alpha3)
+    if ALPHA_BACKGROUND != 255:
+        cv2.convertScaleAbs(alpha3, dst=alpha3, alpha=ALPHA_BACKGROUND / 255.0)
+    cv2.add(image_bgr, alpha3, dst=image_bgr)
+    return image_bgr
+
+
+def _decode_with_pil(source):
+    # Fallback for files OpenCV can't decode (e.g. unusual JPEG/PNG variants)
+    if hasattr(source, 'seek'):
+        source.seek(0)
+        image_pil = Image.open(source)
+    else:
+        image_pil = Image.open(io.BytesIO(source))
+    image_pil = ImageOps.exif_transpose(image_pil)
+    if image_pil.mode in ('RGBA', 'LA', 'P'):
+        image_pil = image_pil.convert('RGBA')
+        background = Image.new('RGBA', image_pil.size, (ALPHA_BACKGROUND,) * 3 + (255,))
+        image_pil = Image.alpha_composite(background, image_pil)
+    image_np = np.array(image_pil.convert('RGB'))
+    # Swap channels in place rather than allocating another buffer
+    return cv2.cvtColor(image_np, cv2.COLOR_RGB2BGR, dst=image_np)
+
+
+def encode_image(image_cv, ext='.jpg', quality=95):
+    """Encodes a BGR array directly to JPEG/PNG bytes (no PIL round trip)."""
+    params = [cv2.IMWRITE_JPEG_QUALITY, quality] if ext in ('.jpg', '.jpeg') else []
+    ok, encoded = cv2.imencode(ext, image_cv, params)
+    if not ok:
+        raise ValueError(f"Could not encode image as {ext}")
+    return encoded.tobytes()
@@ -0,0 +1,310 @@
+"""
+Load test for the upload -> analyze -> report path.
+
+Runs N concurrent virtual users against an in-process instance of the app's
+backend: the same shared analyzer and fair scheduler the Streamlit server uses
+(one per process), a per-user session ImageCache, and db_manager on a scratch
+copy of the database. Each iteration a virtual user:
+
+  1. logs in via the mock-login path: a server-side session is created, then
+     restored the way a page reload does it (auth_manager),
+  2. uploads a batch of images drawn from the configured mix,
+  3. waits for analysis, polling at the app's ANALYSIS_POLL_INTERVAL with the
+     same collect/record step as the app (history, plus usage on the Free plan),
+  4. builds the bulk summary ZIP.
+
+Usage:
+    python loadtest.py --users 20 --duration 60 --batch 5 --mix small:3,large:1,dark:1
+    python loadtest.py --users 50 --iterations 10 --tier Free --json
+
+Reports throughput, latency percentiles per step, error rate and DB lock
+contention (time spent in db_manager calls and "database is locked" errors).
+"""
+import argparse
+import io
+import json
+import os
+import random
+import shutil
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+
+import cv2
+import numpy as np
+
+import auth_manager
+import db_manager
+from analysis import ImageQualityAnalyzer
+from image_cache import ImageCache, ANALYSIS_POLL_INTERVAL, collect_batch
+from reports import bulk_summary_rows, bulk_report_zip
+from scheduler import TaskScheduler, QueueFullError, WORKER_COUNT
+
+# --- Image Mix ---
+# name -> (width, height, format, generator)
+IMAGE_PROFILES = {
+    'small': (800, 600, '.jpg', 'sharp'),
+    'medium': (1600, 1200, '.jpg', 'sharp'),
+    'large': (4000, 3000, '.jpg', 'sharp'),
+    'png': (1200, 1200, '.png', 'sharp'),
+    'dark': (1600, 1200, '.jpg', 'dark'),
+    'blurry': (1600, 1200, '.jpg', 'blurry'),
+}
+DEFAULT_MIX = "small:2,medium:4,large:1,png:1,dark:1,blurry:1"
+
+
+def make_image(width, height, style, seed):
+    rng = np.random.default_rng(seed)
+    image = rng.integers(60, 200, (height // 8, width // 8, 3), dtype=np.uint8)
+    image = cv2.resize(image, (width, height), interpolation=cv2.INTER_NEAREST)
+    for _ in range(20):  # Some hard edges so blur detection has something to find
+        x, y = int(rng.integers(0, width)), int(rng.integers(0, height))
+        cv2.circle(image, (x, y), int(rng.integers(10, max(11, width // 10))), tuple(int(c) for c in rng.integers(0, 255, 3)), -1)
+    if style == 'dark':
+        image //= 4
+    elif style == 'blurry':
+        image = cv2.GaussianBlur(image, (0, 0), 6)
+    return image
+
+
+def build_mix(spec, variants=3):
+    """Encodes `variants` images per profile; returns (weighted choices, {profile: [bytes]})."""
+    weights = {}
+    for part in spec.split(','):
+        name, _, weight = part.partition(':')
+        if name not in IMAGE_PROFILES:
+            raise SystemExit(f"Unknown image profile '{name}'. Choose from: {', '.join(IMAGE_PROFILES)}")
+        weights[name] = float(weight or 1)
+    images = {}
+    for name in weights:
+        w, h, ext, style = IMAGE_PROFILES[name]
+        images[name] = [cv2.imencode(ext, make_image(w, h, style, seed))[1].tobytes() for seed in range(variants)]
+    return weights, images
+
+
+class Upload(io.BytesIO):
+    """Stand-in for Streamlit's UploadedFile (a BytesIO with a name and file id)."""
+    def __init__(self, data, name, file_id):
+        super().__init__(data)
+        self.name = name
+        self.file_id = file_id
+
+
+# --- Metrics ---
+class Metrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies = defaultdict(list)  # step -> seconds
+        self.errors = defaultdict(int)  # step -> count
+        self.db_locked = 0
+        self.images = 0
+        self.iterations = 0
+
+    def record(self, step, seconds):
+        with self._lock:
+            self.latencies[step].append(seconds)
+
+    def error(self, step, exc):
+        with self._lock:
+            self.errors[step] += 1
+            if isinstance(exc, sqlite3.OperationalError) and 'locked' in str(exc):
+                self.db_locked += 1
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))]
+
+
+def instrument_db(metrics):
+    """Wraps the db_manager calls on this path to time them (lock waits show up as DB latency)."""
+    for name in ('create_session', 'get_session', 'get_daily_checks', 'update_user_checks', 'add_analysis_history'):
+        original = getattr(db_manager, name)
+
+        def timed(*args, _original=original, _name=name, **kwargs):
+            start = time.perf_counter()
+            try:
+                return _original(*args, **kwargs)
+            except sqlite3.OperationalError as e:
+                metrics.error(f"db.{_name}", e)
+                raise
+            finally:
+                metrics.record(f"db.{_name}", time.perf_counter() - start)
+        setattr(db_manager, name, timed)
+
+
+# --- Virtual User ---
+def virtual_user(vu, args, analyzer, scheduler, mix, metrics, stop_at):
+    weights, images = mix
+    profiles, profile_weights = list(weights), list(weights.values())
+    rng = random.Random(vu)
+    email = f"loadtest-{vu}@example.com"
+    # What st.session_state.image_cache holds for one browser session (sized to one batch)
+    session_cache = ImageCache(max_entries=max(args.batch, 1))
+    iteration = 0
+
+    while (args.iterations and iteration < args.iterations) or (not args.iterations and time.time() < stop_at):
+        iteration += 1
+        started = time.perf_counter()
+        try:
+            # 1. Login: mock login (one identity per virtual user), session created, then restored by a reload
+            t = time.perf_counter()
+            token = auth_manager.create_session(dict(auth_manager.MOCK_USER, name=f"Load Test {vu}", email=email))
+            restored = auth_manager.restore_login(token)
+            if restored is None:
+                raise RuntimeError("Session was not restored after login")
+            user, daily_checks = restored
+            metrics.record('login', time.perf_counter() - t)
+
+            # 2. Upload
+            batch = args.batch if args.tier == 'Pro' else 1
+            uploads = []
+            for i in range(batch):
+                profile = rng.choices(profiles, profile_weights)[0]
+                data = rng.choice(images[profile])
+                uploads.append(Upload(data, f"{profile}_{iteration}_{i}", f"vu{vu}-it{iteration}-{i}"))
+
+            # 3. Analyze on the shared scheduler, polling like the app's progress fragment
+            t = time.perf_counter()
+            submit = lambda fn, *a: scheduler.submit(fn, *a, user=email, tier=args.tier)
+            keys = [session_cache.request_analysis(u, analyzer, submit) for u in uploads]
+            while True:
+                entries, finished = collect_batch(session_cache, keys, [u.name for u in uploads])
+                checks = db_manager.record_analyses(user['email'], finished, daily_checks if args.tier == 'Free' else None)
+                daily_checks = checks if checks is not None else daily_checks
+                if all(e is not None for e in entries):
+                    break
+                time.sleep(ANALYSIS_POLL_INTERVAL)
+            metrics.record('analyze', time.perf_counter() - t)
+
+            # 4. Bulk report ZIP
+            t = time.perf_counter()
+            results_list = [dict(e.results, filename=u.name) for u, e in zip(uploads, entries)]
+            bulk_report_zip(bulk_summary_rows(results_list))
+            metrics.record('report', time.perf_counter() - t)
+
+            metrics.record('iteration', time.perf_counter() - started)
+            with metrics._lock:
+                metrics.iterations += 1
+                metrics.images += len(uploads)
+        except QueueFullError as e:
+            metrics.error('admission', e)
+        except Exception as e:
+            metrics.error('iteration', e)
+            if args.verbose:
+                print(f"[vu {vu}] {type(e).__name__}: {e}", file=sys.stderr)
+
+
+def run(args):
+    mix = build_mix(args.mix)
+    metrics = Metrics()
+
+    # Scratch DB (fresh, or a copy of --db) so load tests never touch real user data
+    tmpdir = tempfile.mkdtemp(prefix="loadtest-")
+    db_path = os.path.join(tmpdir, "users.db")
+    if args.db and os.path.exists(args.db):
+        shutil.copy(args.db, db_path)
+    db_manager.DB_PATH = db_path
+    db_manager.init_db()
+    instrument_db(metrics)
+
+    analyzer = ImageQualityAnalyzer()
+    scheduler = TaskScheduler(workers=args.workers)
+    stop_at = time.time() + args.duration
+    threads = [
+        threading.Thread(target=virtual_user, args=(vu, args, analyzer, scheduler, mix, metrics, stop_at), daemon=True)
+        for vu in range(args.users)
+    ]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - started
+    queue_stats = scheduler.stats()
+    scheduler.shutdown()
+    shutil.rmtree(tmpdir, ignore_errors=True)
+    return summarize(args, metrics, elapsed, queue_stats)
+
+
+def summarize(args, metrics, elapsed, queue_stats):
+    attempts = metrics.iterations + metrics.errors.get('iteration', 0) + metrics.errors.get('admission', 0)
+    steps = {}
+    for step, values in sorted(metrics.latencies.items()):
+        steps[step] = {
+            'count': len(values),
+            'mean': sum(values) / len(values),
+            'p50': percentile(values, 50),
+            'p90': percentile(values, 90),
+            'p95': percentile(values, 95),
+            'p99': percentile(values, 99),
+            'max': max(values),
+        }
+    db_seconds = sum(sum(v) for k, v in metrics.latencies.items() if k.startswith('db.'))
+    return {
+        'config': {'users': args.users, 'tier': args.tier, 'batch': args.batch, 'mix': args.mix,
+                   'workers': args.workers, 'duration': args.duration, 'iterations': args.iterations},
+        'elapsed': elapsed,
+        'iterations': metrics.iterations,
+        'images': metrics.images,
+        'throughput': {'iterations_per_s': metrics.iterations / elapsed, 'images_per_s': metrics.images / elapsed},
+        'error_rate': (attempts - metrics.iterations) / attempts if attempts else 0.0,
+        'errors': dict(metrics.errors),
+        'db': {'locked_errors': metrics.db_locked, 'total_seconds': db_seconds,
+               'share_of_wall_time': db_seconds / (elapsed * args.users) if elapsed else 0.0},
+        'latency': steps,
+        'scheduler': queue_stats,
+    }
+
+
+def print_report(report):
+    cfg = report['config']
+    print(f"\n=== Load test: {cfg['users']} {cfg['tier']} users, batch {cfg['batch']}, workers {cfg['workers']} ===")
+    print(f"Mix: {cfg['mix']}")
+    print(f"Elapsed {report['elapsed']:.1f}s | {report['iterations']} iterations | {report['images']} images")
+    tp = report['throughput']
+    print(f"Throughput: {tp['iterations_per_s']:.2f} iterations/s, {tp['images_per_s']:.2f} images/s")
+    print(f"Error rate: {report['error_rate']:.2%} {report['errors'] or ''}")
+    db = report['db']
+    print(f"DB: {db['locked_errors']} 'database is locked' errors, {db['total_seconds']:.2f}s in DB calls "
+          f"({db['share_of_wall_time']:.2%} of user time)")
+    print(f"\n{'step':<24}{'count':>7}{'mean':>9}{'p50':>9}{'p90':>9}{'p95':>9}{'p99':>9}{'max':>9}  (ms)")
+    for step, s in report['latency'].items():
+        print(f"{step:<24}{s['count']:>7}" + "".join(f"{s[k] * 1000:>9.1f}" for k in ('mean', 'p50', 'p90', 'p95', 'p99', 'max')))
+    for tier, t in report['scheduler']['tiers'].items():
+        print(f"\nScheduler queue wait ({tier}): p50 {t.get('wait_p50', 0) * 1000:.1f}ms, "
+              f"p95 {t.get('wait_p95', 0) * 1000:.1f}ms, max {t.get('wait_max', 0) * 1000:.1f}ms")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load test the upload -> analyze -> report path.")
+    parser.add_argument('--users', type=int, default=10, help="Concurrent virtual users")
+    parser.add_argument('--duration', type=float, default=30, help="Seconds to run (ignored with --iterations)")
+    parser.add_argument('--iterations', type=int, default=0, help="Iterations per user instead of a fixed duration")
+    parser.add_argument('--batch', type=int, default=5, help="Images per upload (Pro bulk mode; Free always uploads 1)")
+    parser.add_argument('--tier', choices=('Free', 'Pro'), default='Pro')
+    parser.add_argument('--mix', default=DEFAULT_MIX, help=f"Weighted image profiles, from: {', '.join(IMAGE_PROFILES)}")
+    parser.add_argument('--workers', type=int, default=WORKER_COUNT, help="Scheduler worker threads")
+    parser.add_argument('--db', default=None, help="Existing database to copy as the starting state (default: a fresh schema)")
+    parser.add_argument('--max-error-rate', type=float, default=None, help="Exit non-zero above this error rate (for CI)")
+    parser.add_argument('--json', action='store_true', help="Print the report as JSON")
+    parser.add_argument('--verbose', action='store_true')
+    args = parser.parse_args(argv)
+
+    report = run(args)
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
+    if args.max_error_rate is not None and report['error_rate'] > args.max_error_rate:
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,195 @@
+import hashlib
+import re
+import threading
+import time
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from google.auth import exceptions as google_exceptions
+from google.auth import jwt
+from google_auth_oauthlib.flow import Flow
+import db_manager
+
+# --- OAuth Endpoints ---
+# Defaults are Google's; each can be overridden in the client config's "web" section
+# (userinfo_uri, certs_uri, issuer) to run against a local stand-in OAuth server.
+GOOGLE_USERINFO_URI = "https://www.googleapis.com/oauth2/v3/userinfo"
+GOOGLE_CERTS_URI = "https://www.googleapis.com/oauth2/v1/certs"
+GOOGLE_ISSUERS = ("accounts.google.com", "https://accounts.google.com")
+OAUTH_SCOPES = [
+    'openid',
+    'https://www.googleapis.com/auth/userinfo.email',
+    'https://www.googleapis.com/auth/userinfo.profile'
+]
+
+# --- HTTP / Cache Settings ---
+HTTP_TIMEOUT = (3.05, 10)  # (connect, read) seconds
+HTTP_POOL_SIZE = 16
+LOGIN_STATE_TTL = 10 * 60  # A login's state / PKCE verifier must come back within this long
+USERINFO_TTL = 5 * 60
+DEFAULT_CERTS_TTL = 60 * 60  # When the certs response has no Cache-Control max-age
+CLOCK_SKEW = 10  # seconds tolerated when checking ID token timestamps
+
+# One connection pool shared by every OAuth request in the process
+HTTP_ADAPTER = HTTPAdapter(
+    pool_connections=4,
+    pool_maxsize=HTTP_POOL_SIZE,
+    max_retries=Retry(total=2, backoff_factor=0.2, status_forcelist=(502, 503, 504), allowed_methods=("GET",)),
+)
+
+
+def _new_http_session():
+    session = requests.Session()
+    session.mount("https://", HTTP_ADAPTER)
+    session.mount("http://", HTTP_ADAPTER)
+    return session
+
+HTTP_SESSION = _new_http_session()
+
+
+class TTLCache:
+    """Small thread-safe dict whose entries expire after a per-item TTL."""
+    def __init__(self, max_size=1024):
+        self.max_size = max_size
+        self._items = {}  # key -> (value, expires_at)
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                return None
+            if item[1] < time.time():
+                del self._items[key]
+                return None
+            return item[0]
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            now = time.time()
+            if len(self._items) >= self.max_size:
+                for k in [k for k, (_, exp) in self._items.items() if exp < now]:
+                    del self._items[k]
+                if len(self._items) >= self.max_size:
+                    # Still full: drop the entry closest to expiring
+                    del self._items[min(self._items, key=lambda k: self._items[k][1])]
+            self._items[key] = (value, now + ttl)
+
+
+def _token_key(token):
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+class OAuthClient:
+    """
+    Process-wide OAuth helper for one (client, redirect URI) pair.
+    - Every login gets its own state and PKCE verifier (see begin_login). The verifier is
+      stored in the database, so the callback can land on any instance, and used once.
+    - All HTTP goes through one pooled session with timeouts.
+    - ID tokens are validated locally against cached signing certs, so the
+      userinfo request is only needed as a fallback (and its result is cached per token).
+    """
+    def __init__(self, client_config, redirect_uri):
+        self.client_config = client_config
+        self.redirect_uri = redirect_uri
+        web = client_config.get("web") or client_config.get("installed") or {}
+        self.client_id = web.get("client_id")
+        self.userinfo_uri = web.get("userinfo_uri", GOOGLE_USERINFO_URI)
+        self.certs_uri = web.get("certs_uri", GOOGLE_CERTS_URI)
+        issuer = web.get("issuer")
+        self.issuers = (issuer,) if issuer else GOOGLE_ISSUERS
+        self._userinfo = TTLCache()  # sha256(access token) -> user info
+        self._certs = None  # (certs, expires_at)
+        self._lock = threading.Lock()
+
+    def _flow(self, **kwargs):
+        flow = Flow.from_client_config(self.client_config, scopes=OAUTH_SCOPES, redirect_uri=self.redirect_uri, **kwargs)
+        flow.oauth2session.mount("https://", HTTP_ADAPTER)
+        flow.oauth2session.mount("http://", HTTP_ADAPTER)
+        return flow
+
+    def begin_login(self):
+        """
+        Starts one login: returns (authorization URL, state). The caller binds `state` to the
+        browser (a cookie) and checks it when the callback comes back.
+        """
+        flow = self._flow()
+        url, state = flow.authorization_url(prompt='consent', access_type='offline')
+        db_manager.save_oauth_state(state, flow.code_verifier, time.time() + LOGIN_STATE_TTL)
+        return url, state
+
+    def exchange_code(self, code, state):
+        """
+        Trades the authorization code for credentials (one token request).
+        Raises ValueError unless `state` was issued by begin_login, is unexpired and unused.
+        """
+        verifier = db_manager.pop_oauth_state(state) if state else None
+        if verifier is None:
+            raise ValueError("This login link has expired or was already used. Please log in again.")
+        flow = self._flow(state=state, code_verifier=verifier, autogenerate_code_verifier=False)
+        flow.fetch_token(code=code, timeout=HTTP_TIMEOUT)
+        return flow.credentials
+
+    def user_info(self, credentials):
+        """User profile from the ID token when it validates locally, otherwise from the userinfo endpoint."""
+        claims = self.verify_id_token(getattr(credentials, 'id_token', None))
+        if claims and claims.get('email'):
+            return {key: claims.get(key) for key in ('email', 'name', 'picture')}
+        return self.fetch_userinfo(credentials.token)
+
+    def fetch_userinfo(self, access_token):
+        key = _token_key(access_token)
+        cached = self._userinfo.get(key)
+        if cached is not None:
+            return cached
+        response = HTTP_SESSION.get(
+            self.userinfo_uri,
+            headers={'Authorization': f'Bearer {access_token}'},
+            timeout=HTTP_TIMEOUT
+        )
+        if response.status_code != 200:
+            raise ValueError(f"Failed to fetch user info: {response.text}")
+        info = response.json()
+        self._userinfo.set(key, info, USERINFO_TTL)
+        return info
+
+    def verify_id_token(self, id_token):
+        """Returns the ID token's claims if its signature, audience, issuer and expiry check out, else None."""
+        if not id_token:
+            return None
+        try:
+            claims = jwt.decode(id_token, certs=self._signing_certs(), audience=self.client_id,
+                                clock_skew_in_seconds=CLOCK_SKEW)
+        except (ValueError, google_exceptions.GoogleAuthError, requests.RequestException):
+            return None
+        if claims.get('iss') not in self.issuers:
+            return None
+        return claims
+
+    def _signing_certs(self):
+        with self._lock:
+            if self._certs and self._certs[1] > time.time():
+                return self._certs[0]
+        response = HTTP_SESSION.get(self.certs_uri, timeout=HTTP_TIMEOUT)
+        response.raise_for_status()
+        certs = response.json()
+        match = re.search(r"max-age=(\d+)", response.headers.get("Cache-Control", ""))
+        ttl = int(match.group(1)) if match else DEFAULT_CERTS_TTL
+        with self._lock:
+            self._certs = (certs, time.time() + ttl)
+        return certs
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_oauth_client(client_config, redirect_uri):
+    """Cached OAuthClient factory: one instance per client id + redirect URI per process."""
+    web = client_config.get("web") or client_config.get("installed") or {}
+    key = (web.get("client_id"), redirect_uri)
+    with _clients_lock:
+        client = _clients.get(key)
+        if client is None:
+            client = _clients[key] = OAuthClient(client_config, redirect_uri)
+        return client
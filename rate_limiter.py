@@ -0,0 +1,86 @@
+import threading
+import time
+import db_manager
+
+# --- Token Bucket Rate Limiting ---
+# Each key (e.g. "ip:1.2.3.4" or "email:a@b.com") gets a bucket of `capacity`
+# tokens that refills continuously. An attempt takes its token up front, in one
+# step under the lock, so a concurrent burst can never get more attempts through
+# than the bucket holds; attempts that should stay free (e.g. successful logins)
+# hand the token back with refund(). Buckets live in memory; checks and rejected
+# attempts never touch SQLite. A bucket is written behind to the database only
+# when it runs empty (a lockout starts) or a refund lifts a lockout, and each
+# limiter loads the saved lockouts once, so limits survive restarts and carry
+# over to new processes.
+MAX_MEMORY_BUCKETS = 10000
+
+
+class TokenBucketLimiter:
+    def __init__(self, name, capacity, refill_per_second, persist=True):
+        self.name = name
+        self.capacity = float(capacity)
+        self.refill_per_second = float(refill_per_second)
+        self.persist = persist
+        self._buckets = {}  # key -> [tokens, updated_at]
+        self._loaded = not persist
+        self._lock = threading.Lock()
+
+    def acquire(self, key, cost=1.0):
+        """
+        Takes `cost` tokens from the bucket for `key` if it holds them.
+        Returns 0.0 when taken, otherwise the seconds until it will (and takes nothing).
+        """
+        bucket_id = f"{self.name}:{key}"
+        now = time.time()
+        with self._lock:
+            self._load(now)
+            tokens = self._current_tokens(bucket_id, now)
+            if tokens < cost:
+                return (cost - tokens) / self.refill_per_second
+            tokens -= cost
+            self._buckets[bucket_id] = [tokens, now]
+            self._prune(now)
+
+        # Write-behind: only the attempt that leaves the bucket locked out is persisted
+        if self.persist and tokens < cost:
+            db_manager.save_rate_limit(bucket_id, tokens, now)
+        return 0.0
+
+    def refund(self, key, cost=1.0):
+        """Gives back tokens taken by acquire() for an attempt that should not count (capped at capacity)."""
+        bucket_id = f"{self.name}:{key}"
+        now = time.time()
+        with self._lock:
+            self._load(now)
+            before = self._current_tokens(bucket_id, now)
+            tokens = min(self.capacity, before + cost)
+            self._buckets[bucket_id] = [tokens, now]
+
+        # The lockout saved by acquire() no longer holds
+        if self.persist and before < cost <= tokens:
+            db_manager.save_rate_limit(bucket_id, tokens, now)
+
+    def _load(self, now):
+        # Once per process: lockouts saved by earlier runs (fully refilled ones are dropped)
+        if self._loaded:
+            return
+        self._loaded = True
+        full_after = self.capacity / self.refill_per_second
+        for bucket_id, tokens, updated_at in db_manager.load_rate_limits(f"{self.name}:", now - full_after):
+            self._buckets[bucket_id] = [tokens, updated_at]
+
+    def _current_tokens(self, bucket_id, now):
+        state = self._buckets.get(bucket_id)
+        if state is None:
+            return self.capacity
+        tokens, updated_at = state
+        return min(self.capacity, tokens + max(0.0, now - updated_at) * self.refill_per_second)
+
+    def _prune(self, now):
+        # Buckets that have refilled completely carry no state worth keeping in memory
+        if len(self._buckets) <= MAX_MEMORY_BUCKETS:
+            return
+        full_after = self.capacity / self.refill_per_second
+        for bucket_id, (_, updated_at) in list(self._buckets.items()):
+            if now - updated_at >= full_after:
+                del self._buckets[bucket_id]
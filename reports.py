@@ -0,0 +1,49 @@
+import io
+import os
+import zipfile
+import pandas as pd
+from image_io import encode_image
+
+# --- Bulk Reports ---
+# Shared by the app's bulk mode and loadtest.py so both build exactly the same ZIP.
+
+def bulk_summary_rows(results_list):
+    """One summary row per analyzed image."""
+    summary_data = []
+    for r in results_list:
+        summary_data.append({
+            "Filename": r['filename'],
+            "Overall Score": r['overall_score'],
+            "Resolution": f"{r['resolution']['width']}x{r['resolution']['height']}",
+            "Blur Status": r['blur']['status'],
+            "Brightness Status": r['brightness']['status']
+        })
+    return summary_data
+
+
+def bulk_report_zip(summary_data):
+    """ZIP (bytes) containing the combined summary CSV."""
+    zip_buffer = io.BytesIO()
+    with zipfile.ZipFile(zip_buffer, "w") as zf:
+        # Add combined CSV
+        combined_csv = pd.DataFrame(summary_data).to_csv(index=False)
+        zf.writestr("summary_report.csv", combined_csv)
+    return zip_buffer.getvalue()
+
+
+def bulk_image_jpeg(image_cv, quality=95):
+    """One image of the bulk image ZIP, encoded (done per image, on the task that produced it)."""
+    return encode_image(image_cv, '.jpg', quality=quality)
+
+
+def bulk_image_zip(named_jpegs, fileobj=None):
+    """
+    ZIP of (filename, JPEG bytes) pairs from bulk_image_jpeg, added one at a time as they arrive.
+    Returns the ZIP as bytes, or writes it to `fileobj` (e.g. an artifact spill file) and returns None.
+    """
+    zip_buffer = io.BytesIO() if fileobj is None else fileobj
+    with zipfile.ZipFile(zip_buffer, "w") as zf:
+        for filename, jpeg in named_jpegs:
+            # JPEGs are already compressed, so store them as-is
+            zf.writestr(os.path.splitext(filename)[0] + ".jpg", jpeg, compress_type=zipfile.ZIP_STORED)
+    return zip_buffer.getvalue() if fileobj is None else None
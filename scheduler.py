@@ -0,0 +1,226 @@
+import itertools
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+
+# --- Background Work Scheduler ---
+# Analysis and enhancement run on a small shared pool of worker threads instead
+# of the Streamlit script thread. Service levels come from the scheduler:
+# - Weighted fair queuing (start-time fair queuing) across users, so a Pro
+#   bulk upload can't starve everyone else, while Pro gets a bigger share.
+# - A per-user cap on tasks running at once, always below the worker count:
+#   tasks are never preempted, so one user must not be able to occupy every worker.
+# - Large jobs are split into one task per item (submit_chunks), so other users'
+#   tasks interleave with a long batch instead of waiting for all of it.
+# - Admission control: submissions are rejected once the queues are full.
+WORKER_COUNT = max(2, min(8, os.cpu_count() or 2))
+TIER_WEIGHT = {'Pro': 4.0, 'Free': 1.0}
+TIER_MAX_RUNNING = {'Pro': 2, 'Free': 1}  # Per-user concurrency cap
+MAX_QUEUE_DEPTH = 500  # Queued (not yet running) tasks across all users
+MAX_QUEUED_PER_USER = 200
+WAIT_SAMPLES = 1000  # Queue wait times kept per tier for metrics
+
+
+class QueueFullError(RuntimeError):
+    """Raised by submit() when admission control rejects a task."""
+
+
+class _Flow:
+    """Queue and fairness state for one user."""
+    def __init__(self, tier):
+        self.tier = tier
+        self.tasks = deque()  # (start_tag, seq, enqueued_at, future, fn, args, kwargs)
+        self.running = 0
+        self.last_finish = 0.0
+
+    @property
+    def weight(self):
+        return TIER_WEIGHT.get(self.tier, TIER_WEIGHT['Free'])
+
+    @property
+    def max_running(self):
+        return TIER_MAX_RUNNING.get(self.tier, TIER_MAX_RUNNING['Free'])
+
+
+class TaskScheduler:
+    def __init__(self, workers=WORKER_COUNT, max_queue_depth=MAX_QUEUE_DEPTH,
+                 max_queued_per_user=MAX_QUEUED_PER_USER):
+        self.max_queue_depth = max_queue_depth
+        self.max_queued_per_user = max_queued_per_user
+        # At least one worker is always left for other users
+        self.max_running_per_user = max(1, workers - 1)
+        self._flows = {}  # user -> _Flow
+        self._queued = 0
+        self._virtual_time = 0.0
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._shutdown = False
+        self._waits = {}  # tier -> deque of queue wait seconds
+        self._started = {}  # tier -> tasks started
+        self._rejected = 0
+        self._threads = []
+        for i in range(workers):
+            t = threading.Thread(target=self._worker, name=f"analysis-worker-{i}", daemon=True)
+            t.start()
+            self._threads.append(t)
+
+    def submit(self, fn, *args, user=None, tier='Free', cost=1.0, **kwargs):
+        """
+        Queues fn(*args, **kwargs) for `user` and returns a concurrent.futures.Future for its result.
+        `cost` is the task's relative size (e.g. 1 for an analysis); a user's share of the
+        workers is proportional to their tier weight. Raises QueueFullError when rejected.
+        """
+        user = user or 'anonymous'
+        future = Future()
+        with self._cond:
+            if self._shutdown:
+                raise RuntimeError("Scheduler has been shut down.")
+            flow = self._flows.get(user)
+            if flow is None:
+                flow = self._flows[user] = _Flow(tier)
+            flow.tier = tier
+
+            if self._queued >= self.max_queue_depth or len(flow.tasks) >= self.max_queued_per_user:
+                self._rejected += 1
+                raise QueueFullError("Servers are busy right now. Please try again in a moment.")
+
+            # Start-time fair queuing: tags advance by cost / weight per user
+            start_tag = max(self._virtual_time, flow.last_finish)
+            flow.last_finish = start_tag + cost / flow.weight
+            flow.tasks.append((start_tag, next(self._seq), time.monotonic(), future, fn, args, kwargs))
+            self._queued += 1
+            self._cond.notify()
+        return future
+
+    def submit_chunks(self, fn, items, combine, chunk_size=1, user=None, tier='Free', cost=1.0):
+        """
+        Queues fn(chunk) as its own task for each `chunk_size` items of `items` (`cost` per item), then,
+        once every chunk is done, combine(list of fn results, in order) as one more task.
+        Returns a Future for combine's result; a failed chunk fails it, and cancelling it cancels
+        the chunks still queued. Raises QueueFullError (with nothing left queued) when rejected.
+        """
+        items = list(items)
+        chunks = [items[i:i + chunk_size] for i in range(0, len(items), chunk_size)]
+        result = Future()
+        futures = []
+        remaining = [max(1, len(chunks))]  # Chunks still running (an empty job waits for the one call below)
+        lock = threading.Lock()
+
+        def chunk_done(_):
+            with lock:
+                remaining[0] -= 1
+                if remaining[0]:
+                    return
+            if not result.set_running_or_notify_cancel():
+                return
+            try:
+                outputs = [f.result() for f in futures]
+                combined = self.submit(combine, outputs, user=user, tier=tier)
+            except BaseException as e:
+                result.set_exception(e)
+                return
+            combined.add_done_callback(lambda f: result.set_exception(f.exception()) if f.exception()
+                                       else result.set_result(f.result()))
+
+        try:
+            for chunk in chunks:
+                futures.append(self.submit(fn, chunk, user=user, tier=tier, cost=cost * len(chunk)))
+        except QueueFullError:
+            for f in futures:
+                f.cancel()
+            raise
+        result.add_done_callback(lambda f: f.cancelled() and [c.cancel() for c in futures])
+        for f in futures:
+            f.add_done_callback(chunk_done)
+        if not chunks:
+            chunk_done(None)  # Nothing to split: combine([]) runs straight away
+        return result
+
+    def _next_task(self):
+        """Picks the queued task with the lowest start tag among users under their concurrency cap."""
+        best = None
+        for user, flow in self._flows.items():
+            if flow.tasks and flow.running < min(flow.max_running, self.max_running_per_user):
+                head = flow.tasks[0]
+                if best is None or head[:2] < best[1].tasks[0][:2]:
+                    best = (user, flow)
+        if best is None:
+            return None
+        user, flow = best
+        task = flow.tasks.popleft()
+        flow.running += 1
+        self._queued -= 1
+        self._virtual_time = max(self._virtual_time, task[0])
+        return user, flow, task
+
+    def _worker(self):
+        while True:
+            with self._cond:
+                picked = None
+                while not self._shutdown:
+                    picked = self._next_task()
+                    if picked is not None:
+                        break
+                    self._cond.wait()
+                if picked is None:
+                    return
+            user, flow, (_, _, enqueued_at, future, fn, args, kwargs) = picked
+
+            try:
+                if future.set_running_or_notify_cancel():
+                    self._record_wait(flow.tier, time.monotonic() - enqueued_at)
+                    try:
+                        future.set_result(fn(*args, **kwargs))
+                    except BaseException as e:
+                        future.set_exception(e)
+            finally:
+                with self._cond:
+                    flow.running -= 1
+                    if not flow.tasks and not flow.running:
+                        # Idle users are dropped; their tags restart from virtual time on return
+                        del self._flows[user]
+                    self._cond.notify_all()
+
+    def _record_wait(self, tier, seconds):
+        with self._cond:
+            self._waits.setdefault(tier, deque(maxlen=WAIT_SAMPLES)).append(seconds)
+            self._started[tier] = self._started.get(tier, 0) + 1
+
+    # --- Metrics ---
+    def stats(self):
+        """Queue depth, running tasks and queue wait percentiles (seconds) per tier."""
+        with self._cond:
+            tiers = {}
+            for flow in self._flows.values():
+                t = tiers.setdefault(flow.tier, {'queued': 0, 'running': 0, 'users': 0})
+                t['queued'] += len(flow.tasks)
+                t['running'] += flow.running
+                t['users'] += 1
+            for tier, waits in self._waits.items():
+                t = tiers.setdefault(tier, {'queued': 0, 'running': 0, 'users': 0})
+                ordered = sorted(waits)
+                t['started'] = self._started.get(tier, 0)
+                t['wait_p50'] = _percentile(ordered, 50)
+                t['wait_p95'] = _percentile(ordered, 95)
+                t['wait_max'] = ordered[-1]
+            return {'queued': self._queued, 'rejected': self._rejected, 'tiers': tiers}
+
+    def shutdown(self, wait=True):
+        with self._cond:
+            self._shutdown = True
+            for flow in self._flows.values():
+                for task in flow.tasks:
+                    task[3].cancel()
+            self._cond.notify_all()
+        if wait:
+            for t in self._threads:
+                t.join()
+
+
+def _percentile(ordered, pct):
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))
+    return ordered[index]
@@ -0,0 +1,391 @@
+import argparse
+import os
+import threading
+import time
+from collections import deque
+import cv2
+import numpy as np
+
+# --- Super Resolution (FSRCNN x3) ---
+# FSRCNN only sees the luma (Y) channel. Chroma is upscaled with bicubic, as
+# cv2.dnn_superres does. Large images are cut into fixed-size luma tiles with a
+# small context margin. Small images (the usual upscale candidates) go through
+# whole. Same-shape inputs are stacked into one NCHW blob per forward() call:
+# tiles of one image, or a run of equally sized catalog images.
+MODEL_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "FSRCNN_x3.pb")
+SCALE = 3
+SR_TILE = 96  # Tile side (input pixels) for large images; small tiles stay in cache
+SR_TILE_PAD = 6  # Context around each tile; covers FSRCNN's receptive field, so seams are invisible
+SR_WHOLE_MAX_SIDE = 400  # Images up to this size skip tiling (no margin overhead)
+# Inputs per forward() call. On 1-2 cores the classic DNN engine gets no speedup from
+# bigger batches (cache pressure outweighs per-call overhead); raise this, together
+# with SR_THREADS, on larger CPUs. `python superres.py benchmark` measures both.
+SR_BATCH = 1
+SR_THREADS = None  # OpenCV thread count for inference (None = OpenCV default)
+# Fast mode: FSRCNN only where there is detail to restore. Tiles whose luma Laplacian
+# std is below this (flat backgrounds, smooth gradients) keep the bicubic result,
+# which FSRCNN barely differs from there.
+FAST_DETAIL_THRESHOLD = 16.0
+# Fast mode only pays off when it skips enough: an image runs in fast mode only if its
+# detailed tiles (with their context margins) add up to less than this fraction of the
+# input full mode would feed FSRCNN. Otherwise it takes the full path (whole image or
+# all tiles), so fast mode is never slower than full mode.
+FAST_MAX_WORK = 0.8
+UPSCALE_MODES = ('full', 'fast')
+
+
+# --- Model Loading ---
+# The TensorFlow importer in OpenCV 5 wants DepthToSpace's block size as "blocksize",
+# while the FSRCNN graph (like every TF export) names it "block_size". The graph is
+# patched in memory by adding the expected attribute; the model file is untouched.
+def _read_varint(data, pos):
+    result = shift = 0
+    while True:
+        b = data[pos]
+        pos += 1
+        result |= (b & 0x7f) << shift
+        if b < 0x80:
+            return result, pos
+        shift += 7
+
+
+def _varint(n):
+    out = bytearray()
+    while True:
+        b, n = n & 0x7f, n >> 7
+        if not n:
+            out.append(b)
+            return bytes(out)
+        out.append(b | 0x80)
+
+
+def _fields(data):
+    """(field number, wire type, value, raw bytes) for each field of a protobuf message."""
+    pos = 0
+    while pos < len(data):
+        start = pos
+        tag, pos = _read_varint(data, pos)
+        field, wire = tag >> 3, tag & 7
+        if wire == 0:
+            value, pos = _read_varint(data, pos)
+        elif wire == 1:
+            value, pos = data[pos:pos + 8], pos + 8
+        elif wire == 2:
+            size, pos = _read_varint(data, pos)
+            value, pos = data[pos:pos + size], pos + size
+        elif wire == 5:
+            value, pos = data[pos:pos + 4], pos + 4
+        else:
+            raise ValueError(f"Unsupported protobuf wire type {wire}")
+        yield field, wire, value, data[start:pos]
+
+
+def _length_delimited(field, payload):
+    return _varint(field << 3 | 2) + _varint(len(payload)) + payload
+
+
+def patch_depth_to_space(graph):
+    """Returns the GraphDef bytes with a "blocksize" attr added next to each DepthToSpace "block_size"."""
+    out = bytearray()
+    for field, wire, node, raw in _fields(graph):
+        if field == 1 and wire == 2:  # GraphDef.node
+            node_fields = list(_fields(node))
+            is_d2s = any(f == 2 and bytes(v) == b"DepthToSpace" for f, _, v, _ in node_fields)
+            for f, _, attr, _ in node_fields:
+                entry = {ef: ev for ef, _, ev, _ in _fields(attr)} if f == 5 else {}  # NodeDef.attr map entry
+                if is_d2s and bytes(entry.get(1, b"")) == b"block_size":
+                    alias = _length_delimited(1, b"blocksize") + _length_delimited(2, bytes(entry[2]))
+                    raw = _length_delimited(1, bytes(node) + _length_delimited(5, alias))
+                    break
+        out += raw
+    return bytes(out)
+
+
+def load_fsrcnn(model_path=MODEL_PATH):
+    """FSRCNN as a plain cv2.dnn Net (NCHW float input in [0, 1], 3x output)."""
+    with open(model_path, "rb") as f:
+        graph = np.frombuffer(patch_depth_to_space(f.read()), np.uint8)
+    engine = getattr(cv2.dnn, "ENGINE_CLASSIC", None)
+    if engine is None:
+        return cv2.dnn.readNetFromTensorflow(graph)
+    # The new DNN engine can't run this graph's NHWC transposes; the classic one can
+    return cv2.dnn.readNetFromTensorflow(graph, np.zeros(0, np.uint8), engine)
+
+
+# --- Tiled Upscaling ---
+class _UpscaleJob:
+    """One image in flight: its luma tiles, the output luma buffer and the bicubic chroma."""
+    def __init__(self, image_cv, tile, pad, whole_max_side, detail_threshold=None):
+        self.height, self.width = image_cv.shape[:2]
+        self.ycrcb = cv2.cvtColor(image_cv, cv2.COLOR_BGR2YCrCb)
+        whole = max(self.height, self.width) <= whole_max_side
+        detailed = None
+        if detail_threshold is not None:
+            detailed = self._detailed_tiles(tile, detail_threshold)
+            rows, cols = -(-self.height // tile), -(-self.width // tile)
+            full_work = self.height * self.width if whole else rows * cols * (tile + 2 * pad) ** 2
+            if len(detailed) * (tile + 2 * pad) ** 2 < FAST_MAX_WORK * full_work:
+                whole = False
+            else:
+                detailed = None  # Mostly detail (or small enough to run whole): full mode is faster
+        luma = self.ycrcb[..., 0].astype(np.float32)
+        luma *= 1.0 / 255
+        if whole:
+            # One whole-image "tile"; the net's own border handling, as in dnn_superres
+            self.tile_h, self.tile_w, self.pad = self.height, self.width, 0
+            self.luma = luma
+        else:
+            self.tile_h = self.tile_w = tile
+            self.pad = pad
+            # Reflect-pad by the context margin, and out to a whole number of tiles
+            self.luma = cv2.copyMakeBorder(luma, pad, pad + (-self.height % tile), pad, pad + (-self.width % tile),
+                                           cv2.BORDER_REFLECT_101)
+        self.rows, self.cols = -(-self.height // self.tile_h), -(-self.width // self.tile_w)
+        self.out = np.empty((self.rows * self.tile_h * SCALE, self.cols * self.tile_w * SCALE), np.uint8)
+        self.grid = [(r, c) for r in range(self.rows) for c in range(self.cols)]
+        if detailed is not None:
+            # Fast mode: bicubic luma everywhere, and only tiles with detail are queued for FSRCNN
+            h, w = self.height, self.width
+            cv2.resize(self.ycrcb[..., 0], (w * SCALE, h * SCALE), dst=self.out[:h * SCALE, :w * SCALE],
+                       interpolation=cv2.INTER_CUBIC)
+            self.grid = detailed
+        self.remaining = len(self.grid)
+
+    def _detailed_tiles(self, t, threshold):
+        """(row, col) of the t x t tiles whose luma Laplacian std reaches `threshold`."""
+        laplacian = cv2.Laplacian(self.ycrcb[..., 0], cv2.CV_16S)
+        detailed = []
+        for r in range(-(-self.height // t)):
+            for c in range(-(-self.width // t)):
+                _, std = cv2.meanStdDev(laplacian[r * t:(r + 1) * t, c * t:(c + 1) * t])
+                if std[0, 0] >= threshold:
+                    detailed.append((r, c))
+        return detailed
+
+    def tiles(self):
+        th, tw, p = self.tile_h, self.tile_w, self.pad
+        for r, c in self.grid:
+            yield self, r, c, self.luma[r * th:(r + 1) * th + 2 * p, c * tw:(c + 1) * tw + 2 * p]
+
+    def store(self, r, c, upscaled):
+        th, tw, m = self.tile_h * SCALE, self.tile_w * SCALE, self.pad * SCALE
+        self.out[r * th:(r + 1) * th, c * tw:(c + 1) * tw] = upscaled[m:m + th, m:m + tw]
+        self.remaining -= 1
+
+    def result(self):
+        h, w = self.height * SCALE, self.width * SCALE
+        merged = np.empty((h, w, 3), np.uint8)
+        merged[..., 0] = self.out[:h, :w]
+        merged[..., 1:] = cv2.resize(self.ycrcb[..., 1:], (w, h), interpolation=cv2.INTER_CUBIC)
+        return cv2.cvtColor(merged, cv2.COLOR_YCrCb2BGR, dst=merged)
+
+
+class FSRCNNUpscaler:
+    """
+    Batched FSRCNN x3. Large images are split into same-size luma tiles; small images
+    go through whole. Consecutive tiles of the same shape (from one image, or from a
+    run of equally sized images) share a forward() call.
+    The net is not safe for concurrent forward(), so calls are serialized per instance.
+    """
+    def __init__(self, model_path=MODEL_PATH, tile=SR_TILE, pad=SR_TILE_PAD, batch_size=SR_BATCH,
+                 threads=SR_THREADS, whole_max_side=SR_WHOLE_MAX_SIDE):
+        self.model_path = model_path
+        self.tile, self.pad, self.batch_size = tile, pad, batch_size
+        self.whole_max_side = whole_max_side
+        if threads:
+            cv2.setNumThreads(threads)  # Process-wide in OpenCV
+        self._net = load_fsrcnn(model_path)
+        self._lock = threading.Lock()
+
+    def upscale(self, image_cv, mode='full'):
+        return next(self.upscale_many([image_cv], mode))
+
+    def upscale_many(self, images, mode='full'):
+        """
+        Yields the 3x upscale of each BGR image, in order. Images are consumed lazily and
+        each result is yielded as soon as its last tile is done, so a catalog can be
+        streamed through without holding every output in memory.
+        mode='fast' runs FSRCNN only on detailed tiles (see FAST_DETAIL_THRESHOLD), when that
+        saves enough work (see FAST_MAX_WORK); other images get the full-mode upscale.
+        """
+        if mode not in UPSCALE_MODES:
+            raise ValueError(f"Unknown upscale mode: {mode}")
+        detail_threshold = FAST_DETAIL_THRESHOLD if mode == 'fast' else None
+        jobs = deque()
+        batch = []
+        for image_cv in images:
+            job = _UpscaleJob(image_cv, self.tile, self.pad, self.whole_max_side, detail_threshold)
+            jobs.append(job)
+            for tile in job.tiles():
+                if batch and (len(batch) == self.batch_size or batch[0][3].shape != tile[3].shape):
+                    self._forward(batch)
+                    batch = []
+                while jobs and jobs[0].remaining == 0:
+                    yield jobs.popleft().result()
+                batch.append(tile)
+            while jobs and jobs[0].remaining == 0:
+                yield jobs.popleft().result()
+        if batch:
+            self._forward(batch)
+        while jobs:
+            yield jobs.popleft().result()
+
+    def _forward(self, batch):
+        blob = np.stack([tile for _, _, _, tile in batch])[:, None]
+        with self._lock:
+            self._net.setInput(blob)
+            out = self._net.forward()
+        out = np.clip(np.rint(out[:, 0] * 255), 0, 255).astype(np.uint8)
+        for (job, r, c, _), upscaled in zip(batch, out):
+            job.store(r, c, upscaled)
+
+
+# --- Benchmark / Comparison ---
+def _test_images(count, width, height, seed=0):
+    """Photo-like test images: smooth color fields with some edge detail."""
+    rng = np.random.default_rng(seed)
+    images = []
+    for _ in range(count):
+        base = rng.random((max(1, height // 16), max(1, width // 16), 3)) * 255
+        image = cv2.resize(base.astype(np.uint8), (width, height), interpolation=cv2.INTER_CUBIC)
+        images.append(cv2.add(image, (rng.random((height, width, 3)) * 25).astype(np.uint8)))
+    return images
+
+
+def _product_images(count, width, height, seed=0):
+    """Product-shot test images: a detailed object on a plain light background with a soft shadow."""
+    rng = np.random.default_rng(seed)
+    images = []
+    for photo in _test_images(count, width, height, seed):
+        image = np.full((height, width, 3), 240, np.uint8)
+        center = (width // 2 + int(rng.integers(-width // 8, width // 8 + 1)), height // 2)
+        axes = (width // 4, height // 3)
+        shadow = np.zeros((height, width), np.uint8)
+        cv2.ellipse(shadow, (center[0] + width // 30, center[1] + height // 30), axes, 0, 0, 360, 40, -1)
+        image = cv2.subtract(image, cv2.merge([cv2.GaussianBlur(shadow, (0, 0), width / 40)] * 3))
+        mask = np.zeros((height, width), np.uint8)
+        cv2.ellipse(mask, center, axes, 0, 0, 360, 255, -1)
+        image[mask > 0] = photo[mask > 0]
+        images.append(image)
+    return images
+
+
+def ssim(a, b):
+    """Mean SSIM of two 8-bit images (Gaussian window, sigma 1.5), averaged over channels."""
+    c1, c2 = (0.01 * 255) ** 2, (0.03 * 255) ** 2
+    a, b = a.astype(np.float32), b.astype(np.float32)
+    blur = lambda x: cv2.GaussianBlur(x, (11, 11), 1.5)
+    mu_a, mu_b = blur(a), blur(b)
+    var_a = blur(a * a) - mu_a * mu_a
+    var_b = blur(b * b) - mu_b * mu_b
+    cov = blur(a * b) - mu_a * mu_b
+    ssim_map = ((2 * mu_a * mu_b + c1) * (2 * cov + c2)) / ((mu_a * mu_a + mu_b * mu_b + c1) * (var_a + var_b + c2))
+    return float(ssim_map.mean())
+
+
+def _timed(fn, repeat):
+    fn()  # Warm-up (first forward() allocates and tunes)
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def benchmark(args):
+    images = _test_images(args.images, args.width, args.height)
+    megapixels = args.images * args.width * args.height / 1e6
+
+    sr = cv2.dnn_superres.DnnSuperResImpl_create()
+    sr.readModel(args.model)
+    sr.setModel("fsrcnn", SCALE)
+    if args.threads:
+        cv2.setNumThreads(args.threads)
+    single = _timed(lambda: [sr.upsample(image) for image in images], args.repeat)
+    tiling = "whole images" if max(args.width, args.height) <= args.whole_max_side else f"{args.tile}px tiles"
+    print(f"{args.images} images of {args.width}x{args.height} ({megapixels:.2f} MP input), "
+          f"{tiling}, {cv2.getNumThreads()} OpenCV threads")
+    print(f"{'path':<34}{'seconds':>9}{'images/s':>10}{'MP/s':>8}{'speedup':>9}")
+    print(f"{'single-image (dnn_superres)':<34}{single:>9.3f}{args.images / single:>10.2f}{megapixels / single:>8.2f}{1.0:>9.2f}")
+
+    for batch_size in args.batch:
+        upscaler = FSRCNNUpscaler(args.model, tile=args.tile, pad=args.pad, batch_size=batch_size,
+                                  threads=args.threads, whole_max_side=args.whole_max_side)
+        seconds = _timed(lambda: list(upscaler.upscale_many(images)), args.repeat)
+        label = f"batched (batch {batch_size})"
+        print(f"{label:<34}{seconds:>9.3f}{args.images / seconds:>10.2f}{megapixels / seconds:>8.2f}{single / seconds:>9.2f}")
+
+
+def _load_images(paths):
+    images = []
+    for path in paths:
+        image = cv2.imread(path, cv2.IMREAD_COLOR)
+        if image is None:
+            raise SystemExit(f"Could not read image: {path}")
+        images.append(image)
+    return images
+
+
+def compare(args):
+    if args.image:
+        sets = {"files": _load_images(args.image)}
+    else:
+        sets = {
+            "photo": _test_images(args.images, args.width, args.height),
+            "product": _product_images(args.images, args.width, args.height),
+        }
+    upscaler = FSRCNNUpscaler(args.model, threads=args.threads)
+    print(f"fast vs full upscale, FAST_DETAIL_THRESHOLD={FAST_DETAIL_THRESHOLD}, {cv2.getNumThreads()} OpenCV threads")
+    print(f"{'images':<10}{'full s':>9}{'fast s':>9}{'speedup':>9}{'PSNR dB':>9}{'SSIM':>8}"
+          f"{'bicubic PSNR':>14}{'bicubic SSIM':>14}")
+    for name, images in sets.items():
+        outputs = {}
+        def run(mode):
+            outputs[mode] = list(upscaler.upscale_many(images, mode))
+        full = _timed(lambda: run('full'), args.repeat)
+        fast = _timed(lambda: run('fast'), args.repeat)
+        bicubic = [cv2.resize(image, (image.shape[1] * SCALE, image.shape[0] * SCALE), interpolation=cv2.INTER_CUBIC)
+                   for image in images]
+        # Full mode is the reference; bicubic shows how much of the SR detail fast mode keeps
+        psnr = np.mean([cv2.PSNR(f, q) for f, q in zip(outputs['full'], outputs['fast'])])
+        similarity = np.mean([ssim(f, q) for f, q in zip(outputs['full'], outputs['fast'])])
+        bicubic_psnr = np.mean([cv2.PSNR(f, q) for f, q in zip(outputs['full'], bicubic)])
+        bicubic_ssim = np.mean([ssim(f, q) for f, q in zip(outputs['full'], bicubic)])
+        print(f"{name:<10}{full:>9.3f}{fast:>9.3f}{full / fast:>9.2f}{psnr:>9.2f}{similarity:>8.4f}"
+              f"{bicubic_psnr:>14.2f}{bicubic_ssim:>14.4f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="FSRCNN x3 super resolution tools.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    bench = commands.add_parser("benchmark", help="Throughput of the batched path vs one dnn_superres call per image.")
+    bench.add_argument("--images", type=int, default=16)
+    bench.add_argument("--width", type=int, default=320)
+    bench.add_argument("--height", type=int, default=240)
+    bench.add_argument("--tile", type=int, default=SR_TILE)
+    bench.add_argument("--pad", type=int, default=SR_TILE_PAD)
+    bench.add_argument("--whole-max-side", type=int, default=SR_WHOLE_MAX_SIDE, help="Largest image side run without tiling")
+    bench.add_argument("--batch", type=int, nargs="+", default=[1, 4, 16], help="Batch sizes (inputs per forward()) to try")
+    bench.add_argument("--threads", type=int, default=SR_THREADS)
+    bench.add_argument("--repeat", type=int, default=3, help="Timed runs per path (best is reported)")
+    bench.add_argument("--model", default=MODEL_PATH)
+    bench.set_defaults(func=benchmark)
+
+    comp = commands.add_parser("compare", help="Speed and quality (PSNR/SSIM) of fast mode against full mode.")
+    comp.add_argument("--image", nargs="+", help="Image files to compare on (default: synthetic photo and product shots)")
+    comp.add_argument("--images", type=int, default=4)
+    comp.add_argument("--width", type=int, default=480)
+    comp.add_argument("--height", type=int, default=360)
+    comp.add_argument("--threads", type=int, default=SR_THREADS)
+    comp.add_argument("--repeat", type=int, default=2)
+    comp.add_argument("--model", default=MODEL_PATH)
+    comp.set_defaults(func=compare)
+
+    args = parser.parse_args(argv)
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()